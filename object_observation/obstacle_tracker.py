@@ -1,3 +1,6 @@
+import importlib.util
+from pathlib import Path
+
 import torch
 import cv2
 import numpy as np
@@ -6,6 +9,15 @@ from PIL import Image
 import time
 from download import download_model
 
+# same sectors as in simulation: depth_utils only depends on torch and is loaded by its path relative to this file
+# (the training package and its isaacgym dependencies do not need to be installed for deployment)
+_depth_utils_spec = importlib.util.spec_from_file_location(
+    "depth_utils", Path(__file__).resolve().parents[1] / "training_code_isaacgym" / "environments" / "depth_utils.py"
+)
+depth_utils = importlib.util.module_from_spec(_depth_utils_spec)
+_depth_utils_spec.loader.exec_module(depth_utils)
+pool_depth_sectors = depth_utils.pool_depth_sectors
+
 
 class ObstacleTracker:
     def __init__(self, model_path, device, obstacle_threshold=2800, obstacle_value=1, not_obstacle_value=0.5):
@@ -62,8 +74,8 @@ class ObstacleTracker:
         #print(depth_map)
         hight, width = depth_map.shape
         depth_map = depth_map[hight//3:2*(hight//3), :] #trim the first and last third of the image by height
-        distance_points = [depth_map[:, i*(width//12):(i+1)*(width//12)] for i in range(0,12)]  #devide the image into 12 parts by width
-        distance_points = [item.max() for item in distance_points]  #find the minimum depth/maximum value in each part
+        #devide the image into 12 parts by width and find the minimum depth/maximum value in each part
+        distance_points = pool_depth_sectors(torch.from_numpy(depth_map).unsqueeze(0), 12, reduction="max")[0].tolist()
         distance_points = [self.obstacle_value if i < self.obstacle_threshold else self.not_obstacle_value for i in distance_points]  #assign the values to be interpreted as distances
 
         return distance_points
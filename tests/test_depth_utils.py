@@ -0,0 +1,176 @@
+import math
+
+import pytest
+
+torch = pytest.importorskip("torch")
+
+from training_code_isaacgym.environments.depth_utils import (  # noqa: E402
+    cast_depth_rays,
+    get_depth_ray_tangents,
+    get_depth_sector_indices,
+    pool_depth_sectors,
+)
+
+
+def pool_depth_sectors_loop(depth, num_sectors, reduction):
+    """Previous implementation: one reduction per sector"""
+    split_width_indices = torch.linspace(0, depth.shape[-1], num_sectors + 1, dtype=torch.long)
+    if depth.dim() == 3:
+        depth = depth.min(dim=1).values if reduction == "min" else depth.max(dim=1).values
+    sectors = [depth[:, split_width_indices[i]:split_width_indices[i + 1]] for i in range(num_sectors)]
+    return torch.stack(
+        [sector.min(dim=1).values if reduction == "min" else sector.max(dim=1).values for sector in sectors], dim=1
+    )
+
+
+@pytest.mark.parametrize("reduction", ["min", "max"])
+@pytest.mark.parametrize("width", [128, 120, 37])
+@pytest.mark.parametrize("image", [True, False])
+def test_pool_depth_sectors_matches_loop(reduction, width, image):
+    generator = torch.Generator().manual_seed(0)
+    shape = (5, 24, width) if image else (5, width)
+    depth = -torch.rand(shape, generator=generator) * 5
+    expected = pool_depth_sectors_loop(depth, 12, reduction)
+    torch.testing.assert_close(pool_depth_sectors(depth, 12, reduction), expected)
+    sector_indices = get_depth_sector_indices(width, 12)
+    torch.testing.assert_close(pool_depth_sectors(depth, 12, reduction, sector_indices=sector_indices), expected)
+
+
+def test_pool_depth_sectors_unknown_reduction():
+    with pytest.raises(ValueError):
+        pool_depth_sectors(torch.zeros(1, 12), 12, reduction="mean")
+
+
+def cast(origin, yaw, tangents, boxes=(), box_valid=None, room_size=4.0, max_depth=10.0):
+    """Casts rays of a single environment in a room around the origin"""
+    box_centers = torch.tensor([[center for center, _ in boxes]], dtype=torch.float).reshape(1, len(boxes), 2)
+    box_sizes = torch.tensor([[size for _, size in boxes]], dtype=torch.float).reshape(1, len(boxes), 2)
+    if box_valid is None:
+        box_valid = [True] * len(boxes)
+    return cast_depth_rays(
+        torch.tensor([origin], dtype=torch.float),
+        torch.tensor([yaw], dtype=torch.float),
+        torch.tensor(tangents, dtype=torch.float),
+        box_centers,
+        box_sizes,
+        torch.tensor([box_valid], dtype=torch.bool).reshape(1, len(boxes)),
+        torch.zeros(1, 2),
+        torch.tensor([room_size]),
+        torch.tensor([max_depth]),
+    )[0]
+
+
+def test_ray_tangents_point_to_sector_centers():
+    # focal length 2 px: sector centers at columns 1 and 3 of a 4 px wide image, the left sector comes first
+    tangents = get_depth_ray_tangents(90.0, 4, 2, 1)
+    torch.testing.assert_close(tangents, torch.tensor([[0.5], [-0.5]]))
+
+
+def test_ray_tangents_within_sectors():
+    tangents = get_depth_ray_tangents(120.0, 128, 12, 4)
+    assert tangents.shape == (12, 4)
+    # decreasing from left to right and within the field of view
+    assert torch.all(tangents.flatten()[1:] < tangents.flatten()[:-1])
+    assert torch.all(tangents.abs() < math.tan(math.radians(60)))
+
+
+def test_walls():
+    torch.testing.assert_close(cast((0.0, 0.0), 0.0, [0.0]), torch.tensor([2.0]))
+    torch.testing.assert_close(cast((1.0, 0.5), math.pi, [0.0]), torch.tensor([3.0]))
+    # depth along the optical axis: the 45 degree ray hits the corner at x = 2
+    torch.testing.assert_close(cast((0.0, 0.0), 0.0, [1.0, -1.0]), torch.tensor([2.0, 2.0]))
+
+
+def test_boxes():
+    box = ((1.0, 0.0), (0.5, 0.5))
+    torch.testing.assert_close(cast((0.0, 0.0), 0.0, [0.0], [box]), torch.tensor([0.75]))
+    # box behind the camera, box next to the ray and masked box
+    torch.testing.assert_close(cast((0.0, 0.0), math.pi, [0.0], [box]), torch.tensor([2.0]))
+    torch.testing.assert_close(cast((0.0, 0.0), math.pi / 2, [0.0], [box]), torch.tensor([2.0]))
+    torch.testing.assert_close(cast((0.0, 0.0), 0.0, [0.0], [box], box_valid=[False]), torch.tensor([2.0]))
+    # camera inside of a box
+    torch.testing.assert_close(cast((1.0, 0.0), 0.0, [0.0], [box]), torch.tensor([0.0]))
+    # nearest of several boxes
+    boxes = [((1.5, 0.0), (0.5, 0.5)), ((1.0, 0.1), (0.2, 0.2))]
+    torch.testing.assert_close(cast((0.0, 0.0), 0.0, [0.0], boxes), torch.tensor([0.9]))
+
+
+def test_max_depth_and_no_walls():
+    torch.testing.assert_close(cast((0.0, 0.0), 0.0, [0.0], max_depth=1.0), torch.tensor([1.0]))
+    torch.testing.assert_close(cast((0.0, 0.0), 0.0, [0.0, 0.5], room_size=float("inf"), max_depth=5.0), torch.tensor([5.0, 5.0]))
+
+
+FOV = 120.0
+WIDTH = 128
+SECTORS = 12
+
+
+def sector_depths(origins, yaws, rays_per_sector=None, box_centers=None, box_sizes=None, width=WIDTH, room_size=4.0):
+    """Minimum depth per sector of the analytic sensor or, without rays_per_sector, of one ray per image column
+    (rendered depth of the same geometry pooled like the camera images)"""
+    num_envs = len(origins)
+    if box_centers is None:
+        box_centers = torch.zeros(num_envs, 0, 2)
+        box_sizes = torch.zeros(num_envs, 0, 2)
+    if rays_per_sector is None:
+        tangents = get_depth_ray_tangents(FOV, width, width, 1).flatten()
+    else:
+        tangents = get_depth_ray_tangents(FOV, width, SECTORS, rays_per_sector).flatten()
+    depth = cast_depth_rays(
+        origins, yaws, tangents, box_centers, box_sizes, torch.ones(box_centers.shape[:2], dtype=torch.bool),
+        torch.zeros(num_envs, 2), torch.full((num_envs,), room_size), torch.full((num_envs,), 10.0),
+    )
+    if rays_per_sector is None:
+        return pool_depth_sectors(depth, SECTORS, reduction="min")
+    return depth.view(num_envs, SECTORS, -1).amin(dim=-1)
+
+
+def random_poses(num_envs, seed=0):
+    generator = torch.Generator().manual_seed(seed)
+    origins = torch.rand(num_envs, 2, generator=generator) * 3 - 1.5
+    yaws = (torch.rand(num_envs, generator=generator) * 2 - 1) * math.pi
+    return origins, yaws, generator
+
+
+def test_outer_rays_hit_outer_columns():
+    tangents = get_depth_ray_tangents(FOV, WIDTH, SECTORS, 4)
+    column_tangents = get_depth_ray_tangents(FOV, WIDTH, WIDTH, 1).flatten()
+    sector_starts = torch.linspace(0, WIDTH, SECTORS + 1, dtype=torch.long)
+    torch.testing.assert_close(tangents[:, 0], column_tangents[sector_starts[:-1]])
+    torch.testing.assert_close(tangents[:, -1], column_tangents[sector_starts[1:] - 1])
+
+
+def test_wall_depth_of_known_room():
+    # camera in the center of the 4 m room facing a wall: constant depth 2 m in the middle sectors,
+    # the outer sectors see the side walls closest at their outer columns (depth 2 / tangent)
+    depth = sector_depths(torch.zeros(1, 2), torch.zeros(1), rays_per_sector=2)[0]
+    focal_length = WIDTH / 2 / math.tan(math.radians(FOV / 2))
+    outer_depth = 2 / ((WIDTH / 2 - 0.5) / focal_length)
+    torch.testing.assert_close(depth[[0, -1]], torch.tensor([outer_depth, outer_depth]))
+    torch.testing.assert_close(depth[4:8], torch.full((4,), 2.0))
+
+
+@pytest.mark.parametrize("rays_per_sector", [2, 4])
+def test_walls_match_per_column_depth(rays_per_sector):
+    origins, yaws, _ = random_poses(256)
+    torch.testing.assert_close(sector_depths(origins, yaws, rays_per_sector), sector_depths(origins, yaws))
+
+
+def test_one_ray_per_column_matches_per_column_depth():
+    # 10 columns per sector
+    origins, yaws, generator = random_poses(256)
+    box_centers = torch.rand(256, 6, 2, generator=generator) * 3.6 - 1.8
+    box_sizes = torch.rand(256, 6, 2, generator=generator) * 0.4 + 0.05
+    torch.testing.assert_close(
+        sector_depths(origins, yaws, 10, box_centers, box_sizes, width=120),
+        sector_depths(origins, yaws, None, box_centers, box_sizes, width=120),
+    )
+
+
+def test_boxes_never_underestimate_per_column_depth():
+    origins, yaws, generator = random_poses(256)
+    box_centers = torch.rand(256, 6, 2, generator=generator) * 3.6 - 1.8
+    box_sizes = torch.rand(256, 6, 2, generator=generator) * 0.4 + 0.05
+    analytic = sector_depths(origins, yaws, 4, box_centers, box_sizes)
+    reference = sector_depths(origins, yaws, None, box_centers, box_sizes)
+    assert torch.all(analytic >= reference - 1e-5)
@@ -0,0 +1,194 @@
+import math
+
+import pytest
+
+torch = pytest.importorskip("torch")
+
+from training_code_isaacgym.environments.detection_utils import (  # noqa: E402
+    DetectionNoise,
+    FeatureCache,
+    ObjectDetections,
+    detect_most_likely_objects,
+    get_detection_observations,
+    get_distance_and_angle,
+    get_occluded_objects,
+)
+
+
+FOV_ANGLE = math.radians(60)
+ROBOT_LOCATIONS = torch.zeros(1, 3)
+ROBOT_ORIENTATIONS = torch.zeros(1)
+# in front of the robot at 1 m and 2 m and behind the robot
+PLANT_LOCATIONS = torch.tensor([[[2.0, 0.0, 0.0], [1.0, 0.0, 0.0], [-1.0, 0.0, 0.0]]])
+
+
+def detect_with_loop(robot_locations, robot_orientations, object_locations, fov_angle):
+    # previous per environment detection of HighLevelPlantPolicyLeggedRobot._detect_objects() (dummy detection first)
+    most_likely = []
+    for env_idx in range(len(robot_locations)):
+        objects = [{"probability": 0.0, "distance": 0.0, "angle": 0.0, "location": torch.zeros(3)}]
+        for location in object_locations[env_idx]:
+            distance, angle = get_distance_and_angle(robot_locations[env_idx], robot_orientations[env_idx], location)
+            probability = 1.0 if torch.abs(angle) <= fov_angle else 0.0
+            objects.append({"probability": probability, "distance": distance.item(), "angle": angle.item(), "location": location})
+        most_likely.append(sorted(objects, key=lambda p: p["probability"], reverse=True)[0])
+    return most_likely
+
+
+@pytest.mark.parametrize("num_objects", [1, 3, 8])
+def test_detection_matches_per_environment_loop(num_objects):
+    generator = torch.Generator().manual_seed(num_objects)
+    num_envs = 200
+    robot_locations = torch.rand(num_envs, 3, generator=generator) * 6 - 3
+    robot_orientations = (torch.rand(num_envs, generator=generator) * 2 - 1) * math.pi
+    object_locations = torch.rand(num_envs, num_objects, 3, generator=generator) * 8 - 4
+    expected = detect_with_loop(robot_locations, robot_orientations, object_locations, FOV_ANGLE)
+
+    detections = ObjectDetections(num_envs, class_id=3, device="cpu")
+    detect_most_likely_objects(robot_locations, robot_orientations, object_locations, FOV_ANGLE, detections)
+    torch.testing.assert_close(detections.probability, torch.tensor([detection["probability"] for detection in expected]))
+    torch.testing.assert_close(detections.distance, torch.tensor([detection["distance"] for detection in expected]))
+    torch.testing.assert_close(detections.angle, torch.tensor([detection["angle"] for detection in expected]))
+    torch.testing.assert_close(detections.location, torch.stack([detection["location"] for detection in expected]))
+
+
+def test_top_k_detection_in_scene_order():
+    detections = ObjectDetections(1, class_id=3, device="cpu", k=3)
+    detect_most_likely_objects(ROBOT_LOCATIONS, ROBOT_ORIENTATIONS, PLANT_LOCATIONS, FOV_ANGLE, detections)
+    torch.testing.assert_close(detections.probabilities, torch.tensor([[1.0, 1.0, 0.0]]))
+    torch.testing.assert_close(detections.distances, torch.tensor([[2.0, 1.0, 0.0]]))
+    assert detections.object_classes.tolist() == [[3, 3, -1]]
+
+
+def test_top_k_detection_nearest_first():
+    detections = ObjectDetections(1, class_id=3, device="cpu", k=3, nearest_first=True)
+    detect_most_likely_objects(ROBOT_LOCATIONS, ROBOT_ORIENTATIONS, PLANT_LOCATIONS, FOV_ANGLE, detections)
+    torch.testing.assert_close(detections.probabilities, torch.tensor([[1.0, 1.0, 0.0]]))
+    torch.testing.assert_close(detections.distances, torch.tensor([[1.0, 2.0, 0.0]]))
+    torch.testing.assert_close(detections.angles, torch.zeros(1, 3))
+    assert detections.object_classes.tolist() == [[3, 3, -1]]
+    # views on the most likely detection
+    torch.testing.assert_close(detections.location, torch.tensor([[1.0, 0.0, 0.0]]))
+
+
+def test_detection_observations():
+    detections = ObjectDetections(1, class_id=3, device="cpu", k=3, nearest_first=True)
+    robot_orientations = torch.tensor([0.5])
+    detect_most_likely_objects(ROBOT_LOCATIONS, robot_orientations, PLANT_LOCATIONS, FOV_ANGLE, detections)
+    observations = get_detection_observations(detections, 3)
+    assert observations.shape == (1, 3, 3)
+    torch.testing.assert_close(observations, torch.tensor([[[1.0, 1.0, -0.5], [1.0, 2.0, -0.5], [0.0, 0.0, 0.0]]]))
+    torch.testing.assert_close(get_detection_observations(detections, 1), observations[:, :1])
+    # written in place into the preallocated block
+    assert observations.data_ptr() == detections.observations.data_ptr()
+
+
+def test_detection_with_padded_objects():
+    detections = ObjectDetections(1, class_id=3, device="cpu", k=1)
+    valid = torch.tensor([[False, True, True]])
+    detect_most_likely_objects(ROBOT_LOCATIONS, ROBOT_ORIENTATIONS, PLANT_LOCATIONS, FOV_ANGLE, detections, valid)
+    torch.testing.assert_close(detections.distance, torch.tensor([1.0]))
+
+
+def test_occlusion():
+    obstacle_locations = torch.tensor([[[1.5, 0.0, 0.0], [0.0, 1.0, 0.0]]])
+    obstacle_sizes = torch.full((1, 2, 3), 0.5)
+    occluded = get_occluded_objects(
+        ROBOT_LOCATIONS, PLANT_LOCATIONS, obstacle_locations, obstacle_sizes, torch.tensor([[True, True]])
+    )
+    assert occluded.tolist() == [[True, False, False]]
+    occluded = get_occluded_objects(
+        ROBOT_LOCATIONS, PLANT_LOCATIONS, obstacle_locations, obstacle_sizes, torch.tensor([[False, True]])
+    )
+    assert occluded.tolist() == [[False, False, False]]
+
+    detections = ObjectDetections(1, class_id=3, device="cpu", k=1)
+    occluded = torch.tensor([[True, False, False]])
+    detect_most_likely_objects(ROBOT_LOCATIONS, ROBOT_ORIENTATIONS, PLANT_LOCATIONS, FOV_ANGLE, detections, occluded=occluded)
+    torch.testing.assert_close(detections.distance, torch.tensor([1.0]))
+
+
+def test_no_objects():
+    empty = torch.zeros(1, 0, 3)
+    assert get_occluded_objects(ROBOT_LOCATIONS, PLANT_LOCATIONS, empty, empty, torch.zeros(1, 0, dtype=torch.bool)).shape == (1, 3)
+    detections = ObjectDetections(1, class_id=3, device="cpu", k=2)
+    detect_most_likely_objects(ROBOT_LOCATIONS, ROBOT_ORIENTATIONS, empty, FOV_ANGLE, detections)
+    assert detections.object_classes.tolist() == [[-1, -1]]
+
+
+def detect_with_noise(noise, k=3):
+    detections = ObjectDetections(1, class_id=3, device="cpu", k=k, nearest_first=True)
+    detect_most_likely_objects(ROBOT_LOCATIONS, ROBOT_ORIENTATIONS, PLANT_LOCATIONS, FOV_ANGLE, detections, noise=noise)
+    return detections
+
+
+def test_detection_noise_without_errors_is_exact():
+    noise = DetectionNoise(
+        1, FOV_ANGLE, "cpu", distance_noise=0.0, angle_noise=0.0, dropout_probability=0.0, false_positive_probability=0.0
+    )
+    detections = detect_with_noise(noise)
+    torch.testing.assert_close(detections.distances, torch.tensor([[1.0, 2.0, 0.0]]))
+    torch.testing.assert_close(detections.angles, torch.zeros(1, 3))
+
+
+def test_detection_noise_dropouts_and_false_positives():
+    noise = DetectionNoise(1, FOV_ANGLE, "cpu", dropout_probability=1.0, false_positive_probability=1.0, false_positive_max_distance=4.0)
+    detections = detect_with_noise(noise)
+    # only the spurious detection within the field of view remains
+    torch.testing.assert_close(detections.probabilities, torch.tensor([[1.0, 0.0, 0.0]]))
+    assert 0.0 <= detections.distance.item() <= 4.0
+    assert abs(detections.angle.item()) <= FOV_ANGLE
+
+
+def test_detection_noise_is_reproducible():
+    first = detect_with_noise(DetectionNoise(1, FOV_ANGLE, "cpu", seed=1))
+    second = detect_with_noise(DetectionNoise(1, FOV_ANGLE, "cpu", seed=1))
+    torch.testing.assert_close(first.distances, second.distances)
+    torch.testing.assert_close(first.angles, second.angles)
+
+
+def test_detection_noise_streams_do_not_depend_on_number_of_environments():
+    small = DetectionNoise(3, FOV_ANGLE, "cpu", seed=7)
+    large = DetectionNoise(64, FOV_ANGLE, "cpu", seed=7)
+    for _ in range(3):
+        torch.testing.assert_close(small.uniform(5), large.uniform(5)[:3])
+        torch.testing.assert_close(small.normal(4), large.normal(4)[:3])
+    # different seeds give different streams
+    assert not torch.equal(DetectionNoise(3, FOV_ANGLE, "cpu", seed=8).uniform(5), DetectionNoise(3, FOV_ANGLE, "cpu", seed=7).uniform(5))
+
+
+def test_detection_noise_distributions():
+    noise = DetectionNoise(4096, FOV_ANGLE, "cpu")
+    uniform = noise.uniform(16)
+    assert 0.0 < uniform.min() and uniform.max() < 1.0
+    assert abs(uniform.mean().item() - 0.5) < 0.01
+    normal = noise.normal(16)
+    assert torch.isfinite(normal).all()
+    assert abs(normal.mean().item()) < 0.02 and abs(normal.std().item() - 1.0) < 0.02
+    # consecutive samples of a stream are uncorrelated
+    assert abs(torch.corrcoef(torch.stack((normal[:, 0::2].flatten(), normal[:, 1::2].flatten())))[0, 1].item()) < 0.02
+
+
+def test_feature_cache_recomputes_on_new_detections():
+    # like HighLevelPlantPolicyLeggedRobot: features are derived from the detections and the version is increased per detection
+    detections = ObjectDetections(1, class_id=3, device="cpu")
+    version = 0
+    calls = []
+
+    def compute_features():
+        calls.append(version)
+        return {"plant_closeness": torch.exp(-detections.distance) * detections.probability}
+
+    cache = FeatureCache(compute_features)
+    assert cache.get(version)["plant_closeness"].item() == 0.0
+    # rewards and observations of the same step share the features
+    assert cache.get(version) is cache.get(version)
+    assert (cache.hits, cache.misses) == (2, 1)
+
+    detect_most_likely_objects(ROBOT_LOCATIONS, ROBOT_ORIENTATIONS, PLANT_LOCATIONS, FOV_ANGLE, detections)
+    # stale until the version changes
+    assert cache.get(version)["plant_closeness"].item() == 0.0
+    version += 1
+    torch.testing.assert_close(cache.get(version)["plant_closeness"], torch.exp(-torch.tensor([2.0])))
+    assert calls == [0, 1]
+    assert (cache.hits, cache.misses) == (3, 2)
@@ -0,0 +1,96 @@
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("isaacgym")  # has to be imported before torch
+torch = pytest.importorskip("torch")
+rsl_rl_modules = pytest.importorskip("rsl_rl.modules")
+
+from training_code_isaacgym.environments import utils  # noqa: E402
+
+
+NUM_OBSERVATIONS = 48
+NUM_ACTIONS = 12
+
+
+@pytest.fixture
+def checkpoint(tmp_path):
+    torch.manual_seed(0)
+    policy = rsl_rl_modules.ActorCritic(
+        num_actor_obs=NUM_OBSERVATIONS,
+        num_critic_obs=NUM_OBSERVATIONS,
+        num_actions=NUM_ACTIONS,
+        actor_hidden_dims=[512, 256, 128],
+        critic_hidden_dims=[512, 256, 128],
+    )
+    path = tmp_path / "low_lvl_model.pt"
+    torch.save({"model_state_dict": policy.state_dict()}, path)
+    return path, policy.eval()
+
+
+def make_cfg(path, backend):
+    return SimpleNamespace(
+        low_level_policy=SimpleNamespace(
+            path=path,
+            num_observations=NUM_OBSERVATIONS,
+            num_actions=NUM_ACTIONS,
+            backend=backend,
+            dtype="float32",
+            cache_compiled=True,
+        )
+    )
+
+
+def test_low_level_actor_matches_act_inference(checkpoint):
+    _, policy = checkpoint
+    actor_state_dict = {key[len("actor."):]: value for key, value in policy.state_dict().items() if key.startswith("actor.")}
+    actor = utils.LowLevelActor(actor_state_dict).eval()
+    observations = torch.randn(64, NUM_OBSERVATIONS)
+    with torch.inference_mode():
+        torch.testing.assert_close(actor(observations), policy.act_inference(observations))
+
+
+def test_torchscript_backend_matches_act_inference_and_is_cached(checkpoint, monkeypatch):
+    path, policy = checkpoint
+    cfg = make_cfg(path, "torchscript")
+    observations = torch.randn(64, NUM_OBSERVATIONS)
+    with torch.inference_mode():
+        expected = policy.act_inference(observations)
+
+    traced = utils.load_low_level_backend(cfg, "cpu")
+    with torch.inference_mode():
+        torch.testing.assert_close(traced(observations), expected)
+    cache_path = utils.get_low_level_cache_path(path, torch.float32, torch.device("cpu"))
+    assert cache_path.exists()
+
+    # a cache hit does not build the eager policy
+    def fail(*args, **kwargs):
+        raise AssertionError("eager policy was built on a cache hit")
+
+    monkeypatch.setattr(utils, "load_low_level_policy", fail)
+    cached = utils.load_low_level_backend(cfg, "cpu")
+    with torch.inference_mode():
+        torch.testing.assert_close(cached(observations), expected)
+
+
+def test_corrupted_cache_is_traced_again(checkpoint):
+    path, policy = checkpoint
+    cfg = make_cfg(path, "torchscript")
+    utils.load_low_level_backend(cfg, "cpu")
+    cache_path = utils.get_low_level_cache_path(path, torch.float32, torch.device("cpu"))
+    cache_path.write_bytes(cache_path.read_bytes()[:-10])
+
+    traced = utils.load_low_level_backend(cfg, "cpu")
+    observations = torch.randn(64, NUM_OBSERVATIONS)
+    with torch.inference_mode():
+        torch.testing.assert_close(traced(observations), policy.act_inference(observations))
+
+
+def test_cache_path_is_keyed_on_checkpoint_content(checkpoint):
+    path, _ = checkpoint
+    device = torch.device("cpu")
+    cache_path = utils.get_low_level_cache_path(path, torch.float32, device)
+    path.write_bytes(path.read_bytes())
+    assert utils.get_low_level_cache_path(path, torch.float32, device) == cache_path
+    path.write_bytes(path.read_bytes() + b"\0")
+    assert utils.get_low_level_cache_path(path, torch.float32, device) != cache_path
@@ -0,0 +1,50 @@
+import math
+
+import pytest
+
+torch = pytest.importorskip("torch")
+
+from training_code_isaacgym.environments.rotation_utils import axis_angle_to_quaternion, yaw_to_quaternion  # noqa: E402
+
+
+def yaws_with_edge_cases() -> torch.Tensor:
+    generator = torch.Generator().manual_seed(0)
+    random_yaws = (torch.rand(1000, generator=generator) * 2 - 1) * 2 * math.pi
+    return torch.cat((torch.tensor([0.0, math.pi, -math.pi, 1e-8, -1e-8]), random_yaws))
+
+
+def test_yaw_to_quaternion_matches_axis_angle():
+    yaws = yaws_with_edge_cases()
+    axis_angles = torch.zeros(len(yaws), 3)
+    axis_angles[:, 2] = yaws
+    torch.testing.assert_close(yaw_to_quaternion(yaws), axis_angle_to_quaternion(axis_angles))
+
+
+def test_yaw_to_quaternion_values():
+    quaternions = yaw_to_quaternion(torch.tensor([0.0, math.pi, -math.pi, math.pi / 2]))
+    expected = torch.tensor(
+        [
+            [0.0, 0.0, 0.0, 1.0],
+            [0.0, 0.0, 1.0, 0.0],
+            [0.0, 0.0, -1.0, 0.0],
+            [0.0, 0.0, math.sin(math.pi / 4), math.cos(math.pi / 4)],
+        ]
+    )
+    torch.testing.assert_close(quaternions, expected)
+
+
+def test_axis_angle_to_quaternion_arbitrary_rotations():
+    generator = torch.Generator().manual_seed(0)
+    axis_angles = torch.randn(1000, 3, generator=generator)
+    axis_angles[:10] *= 1e-8  # small angle approximation
+    axis_angles[10] = 0.0
+    angles = torch.norm(axis_angles, dim=-1, keepdim=True)
+    axes = axis_angles / angles.clamp(min=1e-12)
+    expected = torch.cat((axes * torch.sin(angles / 2), torch.cos(angles / 2)), dim=-1)
+    quaternions = axis_angle_to_quaternion(axis_angles)
+    torch.testing.assert_close(quaternions, expected)
+    assert not torch.isnan(quaternions).any()
+    # unit quaternions for any batch shape
+    batched = axis_angle_to_quaternion(axis_angles.view(10, 100, 3))
+    torch.testing.assert_close(batched.view(1000, 4), quaternions)
+    torch.testing.assert_close(torch.norm(quaternions, dim=-1), torch.ones(1000))
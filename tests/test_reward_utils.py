@@ -0,0 +1,62 @@
+from types import SimpleNamespace
+
+import pytest
+
+torch = pytest.importorskip("torch")
+
+from training_code_isaacgym.environments.reward_utils import (  # noqa: E402
+    get_object_body_weights,
+    weighted_collision_penalty,
+)
+
+
+def scene_batch(scene_types, num_envs):
+    # attributes of utils.SceneBatch that are used by get_object_body_weights()
+    env_scene_ids = torch.arange(num_envs) % len(scene_types)
+    return SimpleNamespace(
+        scenes=[SimpleNamespace(types=types) for types in scene_types],
+        env_scene_ids=env_scene_ids,
+        scene_env_ids=[(env_scene_ids == i).nonzero(as_tuple=False).flatten() for i in range(len(scene_types))],
+    )
+
+
+def random_forces(num_envs, num_bodies, seed=0):
+    generator = torch.Generator().manual_seed(seed)
+    object_forces = torch.randn(num_envs, num_bodies, 3, generator=generator) * 10
+    object_force_baseline = torch.randn(num_envs, num_bodies, 2, generator=generator)
+    return object_forces, object_force_baseline
+
+
+def test_unit_weights_match_mean_penalty():
+    num_envs = 8
+    scenes = scene_batch([["wall", "flower_pot", "obstacle"]], num_envs)
+    weights = get_object_body_weights(scenes, [[1, 3, 2]], {}, "cpu")
+    object_forces, object_force_baseline = random_forces(num_envs, 6)
+
+    penalty = weighted_collision_penalty(object_forces, object_force_baseline, weights)
+    forces = torch.abs(object_forces[:, :, :2] - object_force_baseline)
+    torch.testing.assert_close(penalty, forces.mean(dim=(1, 2)))
+    # previous implementation: mean over all environments
+    torch.testing.assert_close(penalty.mean(), torch.mean(forces))
+
+
+def test_padded_bodies_are_ignored():
+    # the second scene has fewer bodies, its padded bodies have arbitrary forces
+    scenes = scene_batch([["wall", "flower_pot", "obstacle"], ["wall"]], 4)
+    weights = get_object_body_weights(scenes, [[1, 3, 2], [2]], {}, "cpu")
+    object_forces, object_force_baseline = random_forces(4, 6)
+
+    penalty = weighted_collision_penalty(object_forces, object_force_baseline, weights)
+    forces = torch.abs(object_forces[:, :, :2] - object_force_baseline)
+    torch.testing.assert_close(penalty[0::2], forces[0::2].mean(dim=(1, 2)))
+    torch.testing.assert_close(penalty[1::2], forces[1::2, :2].mean(dim=(1, 2)))
+
+
+def test_type_weights():
+    scenes = scene_batch([["wall", "flower_pot", "obstacle"]], 2)
+    weights = get_object_body_weights(scenes, [[1, 3, 2]], {"wall": 0.0, "obstacle": 2.0}, "cpu")
+    object_forces, object_force_baseline = random_forces(2, 6)
+
+    penalty = weighted_collision_penalty(object_forces, object_force_baseline, weights)
+    forces = torch.abs(object_forces[:, :, :2] - object_force_baseline)
+    torch.testing.assert_close(penalty, (forces[:, 1:4].sum(dim=(1, 2)) + 2 * forces[:, 4:].sum(dim=(1, 2))) / 12)
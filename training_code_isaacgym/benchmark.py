@@ -0,0 +1,315 @@
+import argparse
+import time
+from pathlib import Path
+from typing import Callable, List
+
+from isaacgym import gymapi  # noqa: F401  # unused, isaacgym has to be imported before torch
+from isaacgym.torch_utils import quat_rotate_inverse
+import torch
+from rsl_rl.modules import ActorCritic
+
+from .configs.robots import GO2HighLevelPlantPolicyCfg
+from .configs.scenes import StaticObject, PlantEnvironmentCfg
+from .environments import utils
+
+
+# Benchmarks for parts of the environments that can be run without a simulation
+# e.g. python -m training_code_isaacgym.benchmark placement --num_envs 4096 --device cuda:0
+
+
+asset_path = Path(__file__).parent / "assets/scenes/plant_environment"
+
+
+def dense_room_objects(num_objects: int) -> List[StaticObject]:
+    """Creates the static objects of a 10x10 room that is filled with plants and chairs
+
+    Args:
+        num_objects (int): Number of randomly placed objects (half plants, half chairs)
+
+    Returns:
+        List[StaticObject]: Static objects
+    """
+    static_objects = [StaticObject("walls", "wall", asset_path / "urdf" / "walls_10x10.urdf")]
+    for i in range(num_objects):
+        if i % 2:
+            static_objects.append(StaticObject(
+                "chair", "obstacle", asset_path / "urdf" / "chair1.urdf",
+                init_location=(0.0, 0.0, 0.2), max_random_loc_offset=(4.5, 4.5, 0), size=(0.5, 0.5, 0.5),
+            ))
+        else:
+            static_objects.append(StaticObject(
+                "flower", "flower_pot", asset_path / "urdf" / "plant1.urdf",
+                init_location=(0.0, 0.0, 0.2), max_random_loc_offset=(4.5, 4.5, 0), size=(0.125, 0.125, 0.3),
+            ))
+    return static_objects
+
+
+def measure(function: Callable, device: str, repetitions: int) -> float:
+    """Measures the mean runtime of a function
+
+    Args:
+        function (Callable): Function without arguments
+        device (str): Device of the used tensors (for synchronisation)
+        repetitions (int): Number of measured calls (after one warm-up call)
+
+    Returns:
+        float: Mean runtime in ms
+    """
+    function()
+    if device.startswith("cuda"):
+        torch.cuda.synchronize(device)
+    start = time.perf_counter()
+    for _ in range(repetitions):
+        function()
+    if device.startswith("cuda"):
+        torch.cuda.synchronize(device)
+    return (time.perf_counter() - start) / repetitions * 1000
+
+
+def count_collisions(locations: torch.Tensor, scene: utils.SceneTensor) -> int:
+    """Counts overlapping pairs of randomly placed objects (AABB in the x-y plane) over all environments"""
+    random_objects = scene.random_indices
+    sizes = scene.sizes[random_objects]
+    random_locations = locations[:, random_objects]
+    distances = torch.abs(random_locations.unsqueeze(2) - random_locations.unsqueeze(1))[..., :2]
+    min_distances = ((sizes.unsqueeze(1) + sizes.unsqueeze(0)) / 2)[..., :2]
+    collisions = (distances < min_distances).all(dim=-1)
+    collisions &= ~torch.eye(len(random_objects), dtype=torch.bool, device=locations.device)
+    return int(collisions.sum().item()) // 2
+
+
+def benchmark_placement(args: argparse.Namespace):
+    # runtime and overlapping objects of both samplers, layouts are sampled from the same random state
+    scenes = {"plant_environment": PlantEnvironmentCfg.static_objects}
+    for num_objects in sorted({20, args.num_objects, 200}):
+        scenes[f"dense_room_{num_objects}"] = dense_room_objects(num_objects)
+    env_origins = torch.zeros(args.num_envs, 3, device=args.device)
+    robot_locations = env_origins.clone()
+    robot_locations[:, :2] = torch.rand(args.num_envs, 2, device=args.device) * 2 - 1
+
+    for scene_name, static_objects in scenes.items():
+        scene = utils.SceneTensor(static_objects, args.device)
+        layouts = {}
+        for sampler in ("rejection", "grid"):
+            runtime = measure(
+                lambda: utils.generate_scene_layout(scene, env_origins, robot_locations, sampler=sampler),
+                args.device,
+                args.repetitions,
+            )
+            torch.manual_seed(0)
+            locations, failed = utils.generate_scene_layout(scene, env_origins, robot_locations, sampler=sampler)
+            layouts[sampler] = locations
+            print(
+                f"{scene_name:<20} {sampler:<10} {runtime:10.2f} ms"
+                f" | failed envs: {int(failed.any(dim=1).sum())}/{args.num_envs}"
+                f" | overlapping object pairs: {count_collisions(locations, scene)}"
+            )
+        same_layouts = (layouts["rejection"] == layouts["grid"]).all(dim=-1).all(dim=-1)
+        print(f"{scene_name:<20} same layout in {int(same_layouts.sum())}/{args.num_envs} envs")
+
+
+def benchmark_low_level_policy(args: argparse.Namespace):
+    # randomly initialized low-level policy with the same architecture as in utils.load_low_level_policy()
+    policy = ActorCritic(
+        num_actor_obs=GO2HighLevelPlantPolicyCfg.low_level_policy.num_observations,
+        num_critic_obs=GO2HighLevelPlantPolicyCfg.low_level_policy.num_observations,
+        num_actions=GO2HighLevelPlantPolicyCfg.low_level_policy.num_actions,
+        actor_hidden_dims=[512, 256, 128],
+        critic_hidden_dims=[512, 256, 128],
+    ).to(args.device)
+    num_dof = GO2HighLevelPlantPolicyCfg.low_level_policy.num_actions
+    obs_scales = GO2HighLevelPlantPolicyCfg.normalization.obs_scales
+    num_substeps = GO2HighLevelPlantPolicyCfg.low_level_policy.steps_per_high_level_action
+
+    for num_envs in (128, 1024, 4096):
+        base_lin_vel, base_ang_vel, projected_gravity, high_level_actions = torch.rand(4, num_envs, 3, device=args.device)
+        dof_pos, dof_vel, actions = torch.rand(3, num_envs, num_dof, device=args.device)
+        default_dof_pos = torch.rand(1, num_dof, device=args.device)
+        low_level_obs_buf = torch.zeros(num_envs, 12 + 3 * num_dof, device=args.device)
+
+        # previous implementation: concatenated observations and autograd-tracked inference
+        def concatenated():
+            for _ in range(num_substeps):
+                obs = torch.cat(
+                    (
+                        base_lin_vel * obs_scales.lin_vel,
+                        base_ang_vel * obs_scales.ang_vel,
+                        projected_gravity,
+                        high_level_actions,
+                        (dof_pos - default_dof_pos) * obs_scales.dof_pos,
+                        dof_vel * obs_scales.dof_vel,
+                        actions,
+                    ),
+                    dim=-1,
+                )
+                policy.act_inference(obs)
+
+        # HighLevelPlantPolicyLeggedRobot.compute_low_level_observations() and step()
+        def preallocated():
+            for _ in range(num_substeps):
+                obs = low_level_obs_buf
+                obs[:, 0:3].copy_(base_lin_vel).mul_(obs_scales.lin_vel)
+                obs[:, 3:6].copy_(base_ang_vel).mul_(obs_scales.ang_vel)
+                obs[:, 6:9].copy_(projected_gravity)
+                obs[:, 9:12].copy_(high_level_actions)
+                obs[:, 12:12 + num_dof].copy_(dof_pos).sub_(default_dof_pos).mul_(obs_scales.dof_pos)
+                obs[:, 12 + num_dof:12 + 2 * num_dof].copy_(dof_vel).mul_(obs_scales.dof_vel)
+                obs[:, 12 + 2 * num_dof:].copy_(actions)
+                with torch.inference_mode():
+                    policy.act_inference(obs)
+
+        policy.requires_grad_(True)
+        concatenated_runtime = measure(concatenated, args.device, args.repetitions)
+        policy.requires_grad_(False)
+        preallocated_runtime = measure(preallocated, args.device, args.repetitions)
+        print(
+            f"{num_envs:>5} envs | concatenated: {concatenated_runtime:8.2f} ms"
+            f" | preallocated: {preallocated_runtime:8.2f} ms (per high-level step)"
+        )
+
+
+def benchmark_root_states(args: argparse.Namespace):
+    # per-step root state processing of CompatibleLeggedRobot with interleaved robot and object actors
+    num_objects = args.num_objects + 1
+    root_states_complete = torch.rand(args.num_envs * num_objects, 13, device=args.device)
+    gravity_vec = torch.tensor([[0.0, 0.0, -1.0]], device=args.device).repeat(args.num_envs, 1)
+    robot_actor_ids = torch.arange(0, args.num_envs * num_objects, num_objects, dtype=torch.long, device=args.device)
+    root_states = root_states_complete[robot_actor_ids]
+
+    def process(robot_root_states: torch.Tensor):
+        base_quat = robot_root_states[:, 3:7]
+        quat_rotate_inverse(base_quat, robot_root_states[:, 7:10])
+        quat_rotate_inverse(base_quat, robot_root_states[:, 10:13])
+        quat_rotate_inverse(base_quat, gravity_vec)
+
+    # previous implementation: strided view, written back with a strided copy (e.g. in _push_robots())
+    def strided():
+        strided_root_states = root_states_complete[::num_objects]
+        process(strided_root_states)
+        root_states_complete[::num_objects] = strided_root_states
+
+    # contiguous buffer gathered once after the refresh and scattered with the actor index map
+    def contiguous():
+        torch.index_select(root_states_complete, 0, robot_actor_ids, out=root_states)
+        process(root_states)
+        root_states_complete[robot_actor_ids] = root_states
+
+    print(
+        f"{args.num_envs} envs, {num_objects} actors per env"
+        f" | strided: {measure(strided, args.device, args.repetitions):8.3f} ms"
+        f" | contiguous: {measure(contiguous, args.device, args.repetitions):8.3f} ms"
+    )
+
+
+def benchmark_depth(args: argparse.Namespace):
+    # analytic depth sensor (camera.depth_source = "analytic") in the dense room
+    camera = GO2HighLevelPlantPolicyCfg.camera
+    scene = utils.SceneBatch([dense_room_objects(args.num_objects)], args.num_envs, args.device)
+    env_origins = torch.zeros(args.num_envs, 3, device=args.device)
+    robot_locations = env_origins.clone()
+    robot_locations[:, :2] = torch.rand(args.num_envs, 2, device=args.device) * 9 - 4.5
+    object_locations, _ = scene.generate_layout(torch.arange(args.num_envs, device=args.device), env_origins, robot_locations)
+    orientations = (torch.rand(args.num_envs, device=args.device) * 2 - 1) * torch.pi
+    box_valid = scene.object_valid & (scene.object_sizes[..., :2] > 0).all(dim=-1)
+    wall_sizes = torch.full((args.num_envs,), 10.0, device=args.device)
+    max_depths = torch.full((args.num_envs,), camera.max_depth, device=args.device)
+
+    def depth(ray_tangents: torch.Tensor) -> torch.Tensor:
+        return utils.cast_depth_rays(
+            robot_locations[:, :2], orientations, ray_tangents, object_locations[..., :2], scene.object_sizes[..., :2],
+            box_valid, env_origins[:, :2], wall_sizes, max_depths,
+        )
+
+    # reference: one ray per depth image column pooled like the rendered depth images
+    column_tangents = utils.get_depth_ray_tangents(camera.horizontal_fov, camera.width, camera.width, 1, args.device).flatten()
+    reference = torch.tanh(utils.pool_depth_sectors(depth(column_tangents), camera.split_to_width, reduction="min"))
+    for rays_per_sector in (1, 4, camera.width // camera.split_to_width):
+        ray_tangents = utils.get_depth_ray_tangents(
+            camera.horizontal_fov, camera.width, camera.split_to_width, rays_per_sector, args.device
+        ).flatten()
+        observations = torch.tanh(depth(ray_tangents).view(args.num_envs, camera.split_to_width, -1).amin(dim=-1))
+        error = torch.abs(observations - reference)
+        print(
+            f"{args.num_envs} envs, {rays_per_sector:>2} rays per sector"
+            f" | {measure(lambda: depth(ray_tangents), args.device, args.repetitions):8.3f} ms"
+            f" | error to per column depth: mean {error.mean():.4f}, max {error.max():.4f}"
+        )
+
+
+def benchmark_occlusion(args: argparse.Namespace):
+    # occlusion of plants by chairs in HighLevelPlantPolicyLeggedRobot._detect_objects() in the dense room
+    scene = utils.SceneBatch([dense_room_objects(args.num_objects)], args.num_envs, args.device)
+    env_origins = torch.zeros(args.num_envs, 3, device=args.device)
+    robot_locations = env_origins.clone()
+    robot_locations[:, :2] = torch.rand(args.num_envs, 2, device=args.device) * 9 - 4.5
+    object_locations, _ = scene.generate_layout(torch.arange(args.num_envs, device=args.device), env_origins, robot_locations)
+    plant_locations = scene.gather(object_locations, scene.plant_slots)
+    obstacle_locations = scene.gather(object_locations, scene.obstacle_slots)
+    obstacle_sizes = scene.gather(scene.object_sizes, scene.obstacle_slots)
+
+    def occlusion() -> torch.Tensor:
+        return utils.get_occluded_objects(robot_locations, plant_locations, obstacle_locations, obstacle_sizes, scene.obstacle_valid)
+
+    occluded = occlusion()
+    print(
+        f"{args.num_envs} envs, {plant_locations.shape[1]} plants, {obstacle_locations.shape[1]} obstacles"
+        f" | {measure(occlusion, args.device, args.repetitions):8.3f} ms"
+        f" | occluded plants: {occluded.float().mean() * 100:.1f}%"
+    )
+
+
+def benchmark_quaternions(args: argparse.Namespace):
+    # random_rotation resets in CompatibleLeggedRobot._reset_root_states() and equivalence of the quaternion conversions
+    yaws = torch.rand(args.num_envs, device=args.device) * 2 * torch.pi
+    axis_angles = torch.zeros(args.num_envs, 3, device=args.device)
+    axis_angles[:, 2] = yaws
+    rotations = torch.randn(args.num_envs, 3, device=args.device)
+    rotations[: args.num_envs // 10] *= 1e-7  # small angle approximation
+
+    # previous implementation: boolean mask indexing and a column permutation
+    def masked(axis_angle: torch.Tensor) -> torch.Tensor:
+        angles = torch.norm(axis_angle, p=2, dim=-1, keepdim=True)
+        half_angles = angles * 0.5
+        small_angles = angles.abs() < 1e-6
+        sin_half_angles_over_angles = torch.empty_like(angles)
+        sin_half_angles_over_angles[~small_angles] = torch.sin(half_angles[~small_angles]) / angles[~small_angles]
+        sin_half_angles_over_angles[small_angles] = 0.5 - (angles[small_angles] * angles[small_angles]) / 48
+        quaternions = torch.cat([torch.cos(half_angles), axis_angle * sin_half_angles_over_angles], dim=-1)
+        return quaternions[:, [1, 2, 3, 0]]
+
+    print(
+        f"{args.num_envs} envs"
+        f" | masked: {measure(lambda: masked(axis_angles), args.device, args.repetitions):8.3f} ms"
+        f" | mask-free: {measure(lambda: utils.axis_angle_to_quaternion(axis_angles), args.device, args.repetitions):8.3f} ms"
+        f" | yaw: {measure(lambda: utils.yaw_to_quaternion(yaws), args.device, args.repetitions):8.3f} ms"
+    )
+    print(
+        f"max difference to the previous implementation"
+        f" | mask-free: {torch.abs(utils.axis_angle_to_quaternion(rotations) - masked(rotations)).max():.2e}"
+        f" | yaw: {torch.abs(utils.yaw_to_quaternion(yaws) - masked(axis_angles)).max():.2e}"
+    )
+
+
+benchmarks = {
+    "placement": benchmark_placement,
+    "low_level_policy": benchmark_low_level_policy,
+    "root_states": benchmark_root_states,
+    "depth": benchmark_depth,
+    "occlusion": benchmark_occlusion,
+    "quaternions": benchmark_quaternions,
+}
+
+
+def get_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Environment benchmarks")
+    parser.add_argument("benchmark", choices=list(benchmarks.keys()))
+    parser.add_argument("--num_envs", type=int, default=4096)
+    parser.add_argument("--num_objects", type=int, default=50, help="Number of random objects in the dense scene")
+    parser.add_argument("--repetitions", type=int, default=10)
+    parser.add_argument("--device", type=str, default="cpu")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = get_args()
+    benchmarks[args.benchmark](args)
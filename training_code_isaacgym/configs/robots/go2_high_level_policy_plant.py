@@ -16,10 +16,14 @@ class GO2HighLevelPlantPolicyCfg(GO2DefaultCfg):
         num_observations = 48
         num_actions = 12
         steps_per_high_level_action = 4
+        minimal_substep_bookkeeping = True  # intermediate low-level steps only accumulate terminations and collisions, rewards/resets/observations are computed once per high-level step
+        backend = "torchscript"  # "eager" (rsl_rl ActorCritic), "torchscript" or "compile" (falls back to torchscript)
+        dtype = "float32"  # weights of the torchscript/compile backends: "float32", "float16" (cuda only) or "bfloat16"
+        cache_compiled = True  # caches the traced policy next to the checkpoint (keyed on the checkpoint hash)
 
     class env(GO2DefaultCfg.env):
         num_envs = 128
-        num_observations = 3 + 12
+        num_observations = 3 + 12  # derived from detection and camera on environment creation (see utils.get_num_observations())
         num_privileged_obs = None  # if not None a priviledge_obs_buf will be returned by step() (critic obs for assymetric training). None is returned otherwise
         num_actions = 3
         episode_length_s = 8  # episode length in seconds
@@ -35,6 +39,7 @@ class GO2HighLevelPlantPolicyCfg(GO2DefaultCfg):
     class rewards(GO2DefaultCfg.rewards):
         # Parameters for custom rewards HERE
         only_positive_rewards = False # if true negative total rewards are clipped at zero (avoids early termination problems)
+        object_collision_weights = {"wall": 1.0, "flower_pot": 1.0, "obstacle": 1.0}  # weight of contact forces per object type in the object_collision reward (missing types: 1.0)
 
         class scales():
             # only rewards that have a scale will be added (reward is named "_reward_{SCALE_NAME}")
@@ -54,3 +59,22 @@ class GO2HighLevelPlantPolicyCfg(GO2DefaultCfg):
         rot_of_camera = gymapi.Quat.from_axis_angle(
             gymapi.Vec3(0, 0, 1), np.radians(0)
         )
+        render_only_observed_step = True  # render cameras only in the last low-level step of a high-level action (only its observation is used)
+        envs_per_depth_readback = None  # if set, depth images of only this many envs are read back per rendering (round-robin), others keep their last depth observation (all cameras are still rendered, Isaac Gym only renders all camera sensors at once)
+        depth_source = "camera"  # "camera": rendered depth images, "analytic": rays cast against the walls and object AABBs without camera sensors (see utils.cast_depth_rays())
+        analytic_rays_per_sector = 4  # rays per depth sector of the analytic depth sensor (minimum depth of the rays is used, exact for walls with >= 2 rays, error bound see README)
+        max_depth = 10.0  # depth of rays without hit (analytic depth sensor)
+
+    # object detection (see HighLevelPlantPolicyLeggedRobot._detect_objects()):
+    class detection:
+        occlusion = False  # plants behind obstacles (AABB from StaticObject.size) are not detected
+        num_plants = 1  # number of detected plants per environment in the observations
+        num_obstacles = 0  # number of detected obstacles per environment in the observations
+        nearest_first = False  # orders detections by distance instead of the order of the objects in the scene (changes the most likely plant and obstacle)
+        noise = False  # YOLO-like noise of the detections like in the real detection pipeline (see utils.DetectionNoise)
+        distance_noise = 0.1  # standard deviation of the distance error relative to the distance
+        angle_noise = 0.05  # standard deviation of the angle error [rad]
+        dropout_probability = 0.1  # probability that a visible object is not detected in a step
+        false_positive_probability = 0.02  # probability of a spurious detection per object class, environment and step
+        false_positive_max_distance = 4.0  # spurious detections are sampled uniformly up to this distance within the field of view [m]
+        noise_seed = 0  # seed of the random generator of the noise
@@ -1,6 +1,7 @@
-from .base import BaseSceneCfg, StaticObject, Location, ObjectType
+from .base import BaseSceneCfg, StaticObject, Location, ObjectType, LayoutSampler
 from .empty_room_10x10 import EmptyRoom10x10Cfg
 from .empty_room_5x5 import EmptyRoom5x5Cfg
 from .plant_environment import PlantEnvironmentCfg
 from .single_plant import SinglePlantCfg
-from .single_plant_with_obstacles import SinglePlantWithObstaclesCfg
\ No newline at end of file
+from .single_plant_with_obstacles import SinglePlantWithObstaclesCfg
+from .mixed import MixedSceneCfg
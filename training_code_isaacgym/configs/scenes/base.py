@@ -8,6 +8,7 @@ from isaacgym import gymapi
 
 ObjectType = Literal["robot", "ground", "wall", "flower_pot", "ball", "obstacle"]
 Location = Tuple[float, float, float]
+LayoutSampler = Literal["rejection", "grid"]
 
 
 class StaticObject:
@@ -63,4 +64,14 @@ class BaseSceneCfg:
     """Static objects that are placed into the scenes. (Do not add objects with random location before fixed objects to the list)"""
     # initial_robot_position: Location = ...
     size: float = 3.0
-    spacing: float = 3.0
\ No newline at end of file
+    spacing: float = 3.0
+    layout_sampler: LayoutSampler = "rejection"
+    """Collision checking backend for random object placement ("grid" uses a spatial hash grid and should be used for dense scenes with many objects)"""
+    layout_candidates: int = 100
+    """Number of sampled locations per randomly placed object and environment"""
+    randomize_objects_on_reset: bool = False
+    """Samples new locations of the randomly placed objects on every reset (otherwise the layout of an environment is fixed at initialisation)"""
+    layout_snapshot_dir: Optional[str] = None
+    """Directory of scene layout snapshots. If set, the layouts of the first environments are loaded from the snapshot of this scene, layouts of environments that are not in the snapshot are sampled and added to it"""
+    wall_size: Optional[float] = None
+    """Distance between opposite walls of the scene for the analytic depth sensor (camera.depth_source = "analytic"). Defaults to size if the scene contains walls"""
@@ -0,0 +1,14 @@
+from typing import List
+
+from . import BaseSceneCfg
+from .plant_environment import PlantEnvironmentCfg
+from .single_plant import SinglePlantCfg
+from .single_plant_with_obstacles import SinglePlantWithObstaclesCfg
+
+
+class MixedSceneCfg(BaseSceneCfg):
+    name = "mixed"
+    scenes: List[BaseSceneCfg] = [SinglePlantCfg(), SinglePlantWithObstaclesCfg(), PlantEnvironmentCfg()]
+    """Scenes that are simulated together (environment i uses scene i % len(scenes)). static_objects is ignored"""
+    size: float = max(scene.size for scene in scenes)
+    spacing: float = max(scene.spacing for scene in scenes)
@@ -24,110 +24,137 @@ from . import utils
 class CompatibleLeggedRobot(LeggedRobot, ABC):
     """This class should not be called directly"""
 
-    def _place_static_objects(
-            self, env_idx: int, env_handle: Any, robot_position: torch.Tensor
-    ):
+    def _get_scene_cfgs(self) -> List[Any]:
+        """Returns the scene configs of the environments (several scenes if cfg.scene has a list of scenes, see MixedSceneCfg)"""
+        return getattr(self.cfg.scene, "scenes", None) or [self.cfg.scene]
+
+    def _generate_static_object_layout(self, robot_positions: torch.Tensor):
+        """Samples the locations of all static objects for all environments at once before the actors are created
+        (see utils.SceneBatch.generate_layout()). Environments in which objects could not be placed without collisions
+        are stored in self.failed_layout_env_ids.
+        If cfg.scene.layout_snapshot_dir is set, the layouts of the first environments are loaded from the snapshot of the scene config
+        (robot_positions are overwritten in place). Layouts of environments that are not in the snapshot are sampled and added to it.
+
+        Args:
+            robot_positions (torch.Tensor): Robot locations of all environments with shape: (|environments|, 3)
+        """
+        # compiled once, used for placement, detection and rewards instead of the static objects
+        scenes = [scene_cfg.static_objects for scene_cfg in self._get_scene_cfgs()]
+        self.scene_batch = utils.SceneBatch(scenes, self.num_envs, self.device)
+        if not self.scene_batch.max_objects:
+            # scenes without static objects (e.g. ground_plane) use empty tensors
+            self.static_object_locations = torch.zeros(self.num_envs, 0, 3, dtype=torch.float, device=self.device)
+            self.absolute_plant_locations = self.static_object_locations
+            self.absolute_obstacle_locations = self.static_object_locations
+            return
+        # static objects per environment (padded to the maximum number of objects of all scenes)
+        self.num_static_objects = self.scene_batch.max_objects
+
+        snapshot_dir = getattr(self.cfg.scene, "layout_snapshot_dir", None)
+        if snapshot_dir is not None:
+            scene_fingerprint = utils.get_scene_fingerprint(scenes)
+            snapshot_path = utils.get_layout_snapshot_path(snapshot_dir, self.cfg.scene.name, scene_fingerprint)
+
+        self.static_object_locations = torch.zeros(self.num_envs, self.num_static_objects, 3, dtype=torch.float, device=self.device)
+        failed = torch.zeros(self.num_envs, self.num_static_objects, dtype=torch.bool, device=self.device)
+        num_loaded = 0
+        if snapshot_dir is not None and snapshot_path.exists():
+            # layouts are stored relative to the environment origins
+            object_locations, robot_locations = utils.load_layout_snapshot(
+                snapshot_path, scene_fingerprint, self.num_envs, self.device
+            )
+            num_loaded = len(robot_locations)
+            self.static_object_locations[:num_loaded] = object_locations + self.env_origins[:num_loaded].unsqueeze(1)
+            robot_positions[:num_loaded] = robot_locations + self.env_origins[:num_loaded]
+            print(f"Loaded scene layouts of {num_loaded} environments from {snapshot_path}")
+        if num_loaded < self.num_envs:
+            self.static_object_locations[num_loaded:], failed[num_loaded:] = self.scene_batch.generate_layout(
+                torch.arange(num_loaded, self.num_envs, device=self.device),
+                self.env_origins[num_loaded:],
+                robot_positions[num_loaded:],
+                num_candidates=self.cfg.scene.layout_candidates,
+                sampler=self.cfg.scene.layout_sampler,
+            )
+            if snapshot_dir is not None:
+                utils.save_layout_snapshot(
+                    snapshot_path,
+                    self.static_object_locations - self.env_origins.unsqueeze(1),
+                    robot_positions - self.env_origins,
+                    scene_fingerprint,
+                )
+                print(f"Saved scene layouts of {self.num_envs} environments to {snapshot_path}")
+        # copy for actor creation to prevent device synchronisations for every object
+        self._static_object_locations_cpu = self.static_object_locations.cpu()
+        self.failed_layout_env_ids = failed.any(dim=1).nonzero(as_tuple=False).flatten()
+        if len(self.failed_layout_env_ids):
+            warnings.warn(
+                f"Static objects could not be placed randomly without collisions in {len(self.failed_layout_env_ids)} environments. This can cause problems"
+            )
+
+        self.absolute_plant_locations = self.scene_batch.gather(self.static_object_locations, self.scene_batch.plant_slots)
+        self.absolute_obstacle_locations = self.scene_batch.gather(self.static_object_locations, self.scene_batch.obstacle_slots)
+
+    def _randomize_static_objects(self, env_ids: torch.Tensor, robot_positions: torch.Tensor):
+        """Samples new locations of the static objects in the selected environments (on reset)
+        and writes them into self.root_states_complete (the root states still need to be set in the simulation).
+        Also updates self.absolute_plant_locations and self.absolute_obstacle_locations in place.
+
+        Args:
+            env_ids (torch.Tensor): Environment ids
+            robot_positions (torch.Tensor): New robot locations of the environments with shape: (|env_ids|, 3)
+        """
+        locations, _ = self.scene_batch.generate_layout(
+            env_ids,
+            self.env_origins[env_ids],
+            robot_positions,
+            num_candidates=self.cfg.scene.layout_candidates,
+            sampler=self.cfg.scene.layout_sampler,
+        )
+        # actors of an environment are ordered: robot, static objects
+        object_actor_ids = self.actor_ids.index_select(0, env_ids)[:, 1:].long()
+        if self.scene_batch.uniform:
+            self.root_states_complete[object_actor_ids.view(-1), :3] = locations.view(-1, 3)
+        else:
+            valid = self.scene_batch.object_valid[env_ids]
+            self.root_states_complete[object_actor_ids[valid], :3] = locations[valid]
+
+        self.static_object_locations[env_ids] = locations
+        self.absolute_plant_locations[env_ids] = self.scene_batch.gather(locations, self.scene_batch.plant_slots[env_ids])
+        self.absolute_obstacle_locations[env_ids] = self.scene_batch.gather(locations, self.scene_batch.obstacle_slots[env_ids])
+
+    def _place_static_objects(self, env_idx: int, env_handle: Any):
         """Places static objects like walls into the provided environment
         It is called in the environment creation loop in super()._create_envs()
+        The locations are sampled beforehand for all environments in self._generate_static_object_layout()
+        and the assets are loaded beforehand in self._create_envs() (see utils.AssetCache)
 
         Args:
             env_idx (int): Index of environment
             env_handle (Any): Environment handle
-            robot_position (torch.Tensor): Robot location
         """
-        if not len(self.cfg.scene.static_objects):
+        if not self.scene_batch.max_objects:
             return
         self.object_handles.append([])
 
-        self.num_static_objects = len(self.cfg.scene.static_objects)
-
-        # move all tensors to device
-        for static_obj in self.cfg.scene.static_objects:
-            static_obj.to(self.device)
-
-        _plant_locations = []
-        _obstacle_locations = []
-        other_object_locations = []
-        other_object_sizes = []
-        for object_idx, static_obj in enumerate(self.cfg.scene.static_objects):
-            if len(self.object_assets) - 1 > object_idx:
-                obj_asset = self.object_assets[object_idx]
-            else:
-                obj_asset = self.gym.load_asset(
-                    self.sim,
-                    str(static_obj.asset_root),
-                    str(static_obj.asset_file),
-                    static_obj.asset_options,
-                )
-                self.object_assets.append(obj_asset)
-
+        scene_idx = env_idx % len(self.scene_batch.scenes)
+        scene = self.scene_batch.scenes[scene_idx]
+        locations = self._static_object_locations_cpu[env_idx, : scene.num_objects].tolist()
+        for object_idx, (obj_asset, location) in enumerate(zip(self.scene_object_assets[scene_idx], locations)):
             start_pose = gymapi.Transform()
-            location_offset = self.env_origins[env_idx].clone()
-            i = 0
-            object_location = utils.calculate_random_location(
-                location_offset,
-                static_obj.init_location,
-                static_obj.max_random_loc_offset,
-            )
-            # does not detect collisions of non-random objects (e.g. walls)
-            while i < 100 and static_obj.max_random_loc_offset.any():
-                object_location = utils.calculate_random_location(
-                    location_offset,
-                    static_obj.init_location,
-                    static_obj.max_random_loc_offset,
-                )
-                if utils.validate_location(
-                        static_obj,
-                        object_location,
-                        robot_position,
-                        other_object_locations,
-                        other_object_sizes,
-                ):
-                    break
-                i += 1
-            if i == 100:
-                warnings.warn(
-                    f"Static object could not be placed randomly without collisions ({i} tries). This can cause problems"
-                )
-
-            other_object_locations.append(object_location)
-            other_object_sizes.append(static_obj.size)
-            if static_obj.type == "flower_pot":
-                _plant_locations.append(object_location)
-            if static_obj.type == "obstacle":
-                _obstacle_locations.append(object_location)
-
-            start_pose.p = gymapi.Vec3(*object_location)
+            start_pose.p = gymapi.Vec3(*location)
 
             # env_idx sets collision group, -1 default for collision_filter
             object_handle = self.gym.create_actor(
                 env_handle,
                 obj_asset,
                 start_pose,
-                static_obj.name,
+                scene.names[object_idx],
                 env_idx,
                 -1,
-                static_obj.segmentation_id,
+                scene.segmentation_ids[object_idx],
             )
             self.object_handles[env_idx].append(object_handle)
 
-        plant_locations = torch.stack(_plant_locations).unsqueeze(0)
-        if len(self.absolute_plant_locations):
-            self.absolute_plant_locations = torch.cat(
-                (self.absolute_plant_locations, plant_locations)
-            )
-        else:
-            self.absolute_plant_locations = plant_locations
-
-        if len(_obstacle_locations)>0:
-            obstacle_locations = torch.stack(_obstacle_locations).unsqueeze(0)
-            if len(self.absolute_obstacle_locations):
-                self.absolute_obstacle_locations = torch.cat(
-                    (self.absolute_obstacle_locations, obstacle_locations)
-                )
-            else:
-                self.absolute_obstacle_locations = obstacle_locations
-
     def _create_envs(self):
         """Creates environments:
         1. loads the robot URDF/MJCF asset,
@@ -197,17 +224,33 @@ class CompatibleLeggedRobot(LeggedRobot, ABC):
         self.actor_handles = []
         self.envs = []
         self.object_handles: List[List[Any]] = []  # TODO add type for handle
-        self.object_assets: List[Any] = []  # TODO add type for gym asset
+        # assets of the static objects of each scene (each distinct asset is loaded once and shared by all environments)
+        self.asset_cache = utils.AssetCache(self.gym, self.sim)
+        self.scene_object_assets: List[List[Any]] = [  # TODO add type for gym asset
+            [
+                self.asset_cache.load(static_obj.asset_root, static_obj.asset_file, static_obj.asset_options)
+                for static_obj in scene_cfg.static_objects
+            ]
+            for scene_cfg in self._get_scene_cfgs()
+        ]
+        self.scene_body_counts: List[List[int]] = [
+            [self.gym.get_asset_rigid_body_count(asset) for asset in object_assets] for object_assets in self.scene_object_assets
+        ]
+        if self.asset_cache.loads:
+            print(self.asset_cache)
+
+        robot_positions = self.env_origins.clone()
+        robot_positions[:, :2] += torch_rand_float(
+            -1.0, 1.0, (self.num_envs, 2), device=self.device
+        )
+        # sample static object locations of all environments at once
+        self._generate_static_object_layout(robot_positions)
         for i in range(self.num_envs):
             # create env instance
             env_handle = self.gym.create_env(
                 self.sim, env_lower, env_upper, int(np.sqrt(self.num_envs))
             )
-            pos = self.env_origins[i].clone()
-            pos[:2] += torch_rand_float(-1.0, 1.0, (2, 1), device=self.device).squeeze(
-                1
-            )
-            start_pose.p = gymapi.Vec3(*pos)
+            start_pose.p = gymapi.Vec3(*robot_positions[i])
 
             rigid_shape_props = self._process_rigid_shape_props(
                 rigid_shape_props_asset, i
@@ -235,8 +278,7 @@ class CompatibleLeggedRobot(LeggedRobot, ABC):
             self.actor_handles.append(actor_handle)
 
             # add static objects/ actors to environment
-            # function is only
-            self._place_static_objects(i, env_handle, robot_position=pos)
+            self._place_static_objects(i, env_handle)
 
         self.feet_indices = torch.zeros(
             len(feet_names), dtype=torch.long, device=self.device, requires_grad=False
@@ -293,8 +335,7 @@ class CompatibleLeggedRobot(LeggedRobot, ABC):
         )
         self.dof_vel[env_ids] = 0.0
 
-        env_ids_int32 = env_ids.to(dtype=torch.int32)
-        actor_ids = env_ids_int32 * (getattr(self, "num_static_objects", 0) + 1)
+        actor_ids = self.robot_actor_ids_int32.index_select(0, env_ids)
         self.gym.set_dof_state_tensor_indexed(
             self.sim,
             gymtorch.unwrap_tensor(self.dof_state),
@@ -320,9 +361,9 @@ class CompatibleLeggedRobot(LeggedRobot, ABC):
             self.root_states[env_ids] = self.base_init_state
 
             if getattr(self.cfg.init_state, "random_rotation", False):
-                axis_angles = torch.zeros((len(env_ids), 3), device=self.device)
-                axis_angles[:, 2].uniform_(0, 2 * torch.pi)
-                self.root_states[env_ids, 3:7] = utils.axis_angle_to_quaternion(axis_angles)
+                # only yaw is randomized (utils.axis_angle_to_quaternion() for arbitrary rotations)
+                yaws = torch.empty(len(env_ids), device=self.device).uniform_(0, 2 * torch.pi)
+                self.root_states[env_ids, 3:7] = utils.yaw_to_quaternion(yaws)
 
             # TODO prevent collisions
             max_location_offset = getattr(self.cfg.init_state, "maximum_location_offset", 0.0)
@@ -334,14 +375,19 @@ class CompatibleLeggedRobot(LeggedRobot, ABC):
             -0.5, 0.5, (len(env_ids), 6), device=self.device
         )  # [7:10]: lin vel, [10:13]: ang vel
 
-        _root_states = self.root_states.clone()
-        # TODO randomize object positions on every reset and not just during initialization
-        reset_indices = utils.get_reset_indices(env_ids, self.num_objects)
+        # all actors (robot and static objects) of the reset environments
+        reset_indices = self.actor_ids.index_select(0, env_ids)
+        if self.scene_batch.uniform:
+            reset_indices = reset_indices.view(-1)
+        else:
+            reset_indices = reset_indices[self.actor_valid.index_select(0, env_ids)]
+        reset_actor_ids = reset_indices.long()
 
-        self.root_states_complete[reset_indices] = self.root_states_initialization[
-            reset_indices
-        ]
-        self.root_states_complete[:: self.num_objects] = _root_states
+        self.root_states_complete[reset_actor_ids] = self.root_states_initialization[reset_actor_ids]
+        if self.cfg.scene.randomize_objects_on_reset and self.scene_batch.max_objects:
+            self._randomize_static_objects(env_ids, self.root_states[env_ids, :3])
+        # robot root states are only scattered into the interleaved simulation tensor before it is set
+        self.root_states_complete.index_copy_(0, self.robot_actor_ids.index_select(0, env_ids), self.root_states.index_select(0, env_ids))
 
         self.gym.set_actor_root_state_tensor_indexed(
             self.sim,
@@ -350,7 +396,8 @@ class CompatibleLeggedRobot(LeggedRobot, ABC):
             len(reset_indices),
         )
 
-        self.object_force_baseline[env_ids] = self.object_forces[env_ids]
+        # only the x-y forces of the reset environments are copied
+        self.object_force_baseline.index_copy_(0, env_ids, self.object_forces.index_select(0, env_ids)[:, :, :2])
 
     def _push_robots(self):
         """Random pushes the robots. Emulates an impulse by setting a randomized base velocity."""
@@ -358,14 +405,8 @@ class CompatibleLeggedRobot(LeggedRobot, ABC):
         self.root_states[:, 7:9] = torch_rand_float(
             -max_vel, max_vel, (self.num_envs, 2), device=self.device
         )  # lin vel x/y
-        self.root_states_complete[:: self.num_objects] = self.root_states
-        indices = torch.arange(
-            0,
-            self.num_envs * self.num_objects,
-            self.num_objects,
-            dtype=torch.int32,
-            device=self.device,
-        )
+        self.root_states_complete[self.robot_actor_ids] = self.root_states
+        indices = self.robot_actor_ids_int32
         self.gym.set_actor_root_state_tensor_indexed(
             self.sim,
             gymtorch.unwrap_tensor(self.root_states_complete),
@@ -373,6 +414,61 @@ class CompatibleLeggedRobot(LeggedRobot, ABC):
             len(indices),
         )
 
+    def _refresh_root_states(self):
+        """Refreshes the simulation root state tensor and gathers the robot root states into the contiguous self.root_states"""
+        self.gym.refresh_actor_root_state_tensor(self.sim)
+        torch.index_select(self.root_states_complete, 0, self.robot_actor_ids, out=self.root_states)
+
+    def _refresh_contact_forces(self):
+        """Refreshes the simulation contact force tensor and gathers the contact forces of the robot and object bodies of each environment
+        (only for mixed scenes, environments of a single scene use views on the simulation tensor)"""
+        self.gym.refresh_net_contact_force_tensor(self.sim)
+        if self.gather_contact_forces:
+            torch.index_select(self.contact_forces_complete, 0, self.robot_body_ids.view(-1), out=self.contact_forces.view(-1, 3))
+            torch.index_select(self.contact_forces_complete, 0, self.object_body_ids.view(-1), out=self.object_forces.view(-1, 3))
+
+    def _update_base_states(self):
+        """Updates the base quantities of the robots from the refreshed root states (same as in LeggedRobot.post_physics_step())"""
+        self.base_pos[:] = self.root_states[:, 0:3]
+        self.base_quat[:] = self.root_states[:, 3:7]
+        self.rpy[:] = get_euler_xyz_in_tensor(self.base_quat[:])
+        self.base_lin_vel[:] = quat_rotate_inverse(self.base_quat, self.root_states[:, 7:10])
+        self.base_ang_vel[:] = quat_rotate_inverse(self.base_quat, self.root_states[:, 10:13])
+        self.projected_gravity[:] = quat_rotate_inverse(self.base_quat, self.gravity_vec)
+
+    def post_physics_step(self):
+        """Same steps as LeggedRobot.post_physics_step(), but the simulation tensors are refreshed only once and
+        the robot root states and contact forces are gathered right after the refresh (see self._refresh_root_states())
+        """
+        self._refresh_root_states()
+        self._refresh_contact_forces()
+
+        self.episode_length_buf += 1
+        self.common_step_counter += 1
+
+        # prepare quantities
+        self._update_base_states()
+
+        self._post_physics_step_callback()
+
+        # compute observations, rewards, resets, ...
+        self.check_termination()
+        self.compute_reward()
+        env_ids = self.reset_buf.nonzero(as_tuple=False).flatten()
+        self.reset_idx(env_ids)
+
+        if self.cfg.domain_rand.push_robots:
+            self._push_robots()
+
+        self.compute_observations()  # in some cases a simulation step might be required to refresh some obs (for example body positions)
+
+        self.last_actions[:] = self.actions[:]
+        self.last_dof_vel[:] = self.dof_vel[:]
+        self.last_root_vel[:] = self.root_states[:, 7:13]
+
+        if self.viewer and self.enable_viewer_sync and getattr(self, "debug_viz", False):
+            self._draw_debug_vis()
+
     # ----------------------------------------
     def _init_buffers(self):
         """Initialize torch tensors which will contain simulation states and processed quantities"""
@@ -389,7 +485,15 @@ class CompatibleLeggedRobot(LeggedRobot, ABC):
         self.root_states_initialization = self.root_states_complete.clone()
         # root_states_complete includes root_states of static objects which is not desired for the following logic
         self.num_objects = getattr(self, "num_static_objects", 0) + 1
-        self.root_states = self.root_states_complete[:: self.num_objects]
+        # actor index table: simulation actor indices of the robot (column 0) and the static objects of each environment
+        # (padded if the environments use scenes with different numbers of objects, see self.actor_valid)
+        actor_ids, self.actor_valid = utils.get_index_table(self.scene_batch.num_env_objects + 1, self.num_objects)
+        self.actor_ids = actor_ids.to(dtype=torch.int32)
+        self.robot_actor_ids_int32 = self.actor_ids[:, 0].contiguous()
+        # robot root states are kept in a contiguous buffer (gathered in self._refresh_root_states(),
+        # scattered into root_states_complete with self.robot_actor_ids before setting the simulation tensor)
+        self.robot_actor_ids = self.robot_actor_ids_int32.long()
+        self.root_states = self.root_states_complete[self.robot_actor_ids]
 
         self.dof_state = gymtorch.wrap_tensor(dof_state_tensor)
         self.dof_pos = self.dof_state.view(self.num_envs, self.num_dof, 2)[..., 0]
@@ -397,12 +501,25 @@ class CompatibleLeggedRobot(LeggedRobot, ABC):
         self.base_quat = self.root_states[:, 3:7]
         self.rpy = get_euler_xyz_in_tensor(self.base_quat)
         self.base_pos = self.root_states[: self.num_envs, 0:3]
-        self.contact_forces = gymtorch.wrap_tensor(net_contact_forces).view(
-            self.num_envs, -1, 3
+        # rigid body index table: robot bodies followed by the (padded) bodies of the static objects of each environment
+        self.contact_forces_complete = gymtorch.wrap_tensor(net_contact_forces)
+        scene_bodies = torch.tensor([sum(body_counts) for body_counts in self.scene_body_counts], dtype=torch.long, device=self.device)
+        body_ids, _ = utils.get_index_table(
+            scene_bodies[self.scene_batch.env_scene_ids] + self.num_bodies, self.num_bodies + int(scene_bodies.max().item())
         )
-        self.object_forces = self.contact_forces[:, self.num_bodies :]
-        self.object_force_baseline = self.object_forces.clone()
-        self.contact_forces = self.contact_forces[:, : self.num_bodies]  # shape: num_envs, num_bodies, xyz axis
+        self.robot_body_ids = body_ids[:, : self.num_bodies].contiguous()
+        self.object_body_ids = body_ids[:, self.num_bodies :].contiguous()  # padded bodies point to the robot base (weight 0 in rewards)
+        # environments of a single scene have the same bodies: zero-copy views on the simulation tensor,
+        # mixed scenes are gathered in self._refresh_contact_forces()
+        self.gather_contact_forces = not self.scene_batch.uniform
+        if self.gather_contact_forces:
+            self.contact_forces = self.contact_forces_complete[self.robot_body_ids]  # shape: num_envs, num_bodies, xyz axis
+            self.object_forces = self.contact_forces_complete[self.object_body_ids]
+        else:
+            contact_forces = self.contact_forces_complete.view(self.num_envs, -1, 3)
+            self.contact_forces = contact_forces[:, : self.num_bodies]  # shape: num_envs, num_bodies, xyz axis
+            self.object_forces = contact_forces[:, self.num_bodies :]
+        self.object_force_baseline = self.object_forces[:, :, :2].clone()  # x-y forces (see self._reset_root_states())
 
         # initialize some data used later on
         self.common_step_counter = 0
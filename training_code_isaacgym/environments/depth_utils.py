@@ -0,0 +1,148 @@
+from typing import Optional
+import math
+
+import torch
+
+
+# only depends on torch so that it can also be used in deployment (see object_observation/obstacle_tracker.py)
+
+
+def get_depth_sector_indices(width: int, num_sectors: int, device: str = "cpu") -> torch.Tensor:
+    """Assigns each image column to a sector. Sectors are split at torch.linspace(0, width, num_sectors + 1, dtype=torch.long)
+    so widths that are not divisible by num_sectors result in sectors with slightly different widths.
+
+    Args:
+        width (int): Width of the depth image (in pixels)
+        num_sectors (int): Number of sectors
+        device (str, optional): Device for tensors. Defaults to "cpu".
+
+    Returns:
+        torch.Tensor: Sector index of each column with shape: (width)
+    """
+    split_width_indices = torch.linspace(0, width, num_sectors + 1, dtype=torch.long)
+    sector_widths = split_width_indices[1:] - split_width_indices[:-1]
+    return torch.repeat_interleave(torch.arange(num_sectors), sector_widths).to(device)
+
+
+def pool_depth_sectors(
+    depth: torch.Tensor,
+    num_sectors: int,
+    reduction: str = "min",
+    sector_indices: Optional[torch.Tensor] = None,
+) -> torch.Tensor:
+    """Reduces depth images to the minimum (or maximum) value in each of num_sectors vertical sectors.
+
+    Args:
+        depth (torch.Tensor): Depth images with shape: (|images|, height, width) or (|images|, width)
+        num_sectors (int): Number of sectors
+        reduction (str, optional): "min" or "max". Defaults to "min".
+        sector_indices (Optional[torch.Tensor], optional): Precomputed get_depth_sector_indices(). Defaults to None.
+
+    Returns:
+        torch.Tensor: Pooled depth with shape: (|images|, num_sectors)
+    """
+    if reduction not in ("min", "max"):
+        raise ValueError(f"Unknown reduction {reduction}. Use 'min' or 'max'.")
+    if depth.dim() == 3:
+        depth = depth.amin(dim=1) if reduction == "min" else depth.amax(dim=1)
+    num_images, width = depth.shape
+
+    # sectors have the same width: a single reshape is sufficient
+    if width % num_sectors == 0:
+        sectors = depth.reshape(num_images, num_sectors, width // num_sectors)
+        return sectors.amin(dim=-1) if reduction == "min" else sectors.amax(dim=-1)
+
+    if sector_indices is None:
+        sector_indices = get_depth_sector_indices(width, num_sectors, depth.device)
+    initial_value = float("inf") if reduction == "min" else float("-inf")
+    pooled = torch.full((num_images, num_sectors), initial_value, dtype=depth.dtype, device=depth.device)
+    return pooled.scatter_reduce_(
+        1, sector_indices.expand(num_images, -1), depth, reduce="amin" if reduction == "min" else "amax"
+    )
+
+
+def get_depth_ray_tangents(horizontal_fov: float, width: int, num_sectors: int, rays_per_sector: int = 1, device: str = "cpu") -> torch.Tensor:
+    """Horizontal directions of the rays of the analytic depth sensor as tangents of the angle to the optical axis
+    (positive to the left). The first and last rays of a sector point to the centers of its outer depth image columns
+    (see get_depth_sector_indices()) and the other rays are evenly spaced in between, a single ray per sector points to the center of the sector.
+    The depth of a plane (e.g. a wall) is monotonic within a sector, so with at least 2 rays per sector the minimum depth
+    of walls equals the minimum over all columns. With one ray per column, the rays point to the centers of all columns.
+
+    Args:
+        horizontal_fov (float): Horizontal field of view of the camera (in degrees)
+        width (int): Width of the depth image (in pixels)
+        num_sectors (int): Number of sectors (camera.split_to_width)
+        rays_per_sector (int, optional): Number of rays per sector. Defaults to 1.
+        device (str, optional): Device for tensors. Defaults to "cpu".
+
+    Returns:
+        torch.Tensor: Tangents with shape: (num_sectors, rays_per_sector)
+    """
+    split_width_indices = torch.linspace(0, width, num_sectors + 1, dtype=torch.long).float()
+    sector_widths = split_width_indices[1:] - split_width_indices[:-1]
+    if rays_per_sector == 1:
+        columns = (split_width_indices[:-1] + sector_widths / 2).unsqueeze(1)
+    else:
+        ray_offsets = torch.arange(rays_per_sector, dtype=torch.float) / (rays_per_sector - 1)
+        columns = split_width_indices[:-1].unsqueeze(1) + 0.5 + (sector_widths - 1).unsqueeze(1) * ray_offsets
+    focal_length = width / 2 / math.tan(math.radians(horizontal_fov) / 2)
+    # image columns go from left to right
+    return ((width / 2 - columns) / focal_length).to(device)
+
+
+def cast_depth_rays(
+    origins: torch.Tensor,
+    orientations: torch.Tensor,
+    ray_tangents: torch.Tensor,
+    box_centers: torch.Tensor,
+    box_sizes: torch.Tensor,
+    box_valid: torch.Tensor,
+    room_centers: torch.Tensor,
+    room_sizes: torch.Tensor,
+    max_depths: torch.Tensor,
+) -> torch.Tensor:
+    """Casts horizontal rays of a virtual depth sensor against the walls and the object AABBs of all environments at once (x-y plane).
+    Like the depth images of the camera, the returned depth is the distance along the optical axis (not along the ray).
+    Objects are treated as infinitely high boxes and the walls as the inner side of a box around the room center.
+
+    Args:
+        origins (torch.Tensor): Absolute locations of the cameras (in m) with shape: (|environments|, 2)
+        orientations (torch.Tensor): Orientations/ yaw of the cameras (in radians) with shape: (|environments|)
+        ray_tangents (torch.Tensor): Ray directions (see get_depth_ray_tangents()) with shape: (|rays|)
+        box_centers (torch.Tensor): Absolute locations of the objects with shape: (|environments|, |objects|, 2)
+        box_sizes (torch.Tensor): Sizes of the objects with shape: (|environments|, |objects|, 2)
+        box_valid (torch.Tensor): Objects that are hit by rays with shape: (|environments|, |objects|)
+        room_centers (torch.Tensor): Absolute locations of the room centers with shape: (|environments|, 2)
+        room_sizes (torch.Tensor): Distance between opposite walls (inf if there are no walls) with shape: (|environments|)
+        max_depths (torch.Tensor): Depth of rays without hit with shape: (|environments|)
+
+    Returns:
+        torch.Tensor: Depth of each ray with shape: (|environments|, |rays|)
+    """
+    cos = torch.cos(orientations).unsqueeze(1)
+    sin = torch.sin(orientations).unsqueeze(1)
+    # direction (1, tangent) in the camera frame: the ray parameter equals the depth along the optical axis
+    directions = torch.stack((cos - ray_tangents * sin, sin + ray_tangents * cos), dim=-1)
+    directions = torch.where(directions.abs() < 1e-6, torch.full_like(directions, 1e-6), directions)
+    inverse_directions = 1.0 / directions
+
+    # walls: first exit of the room box (slab test from the inside)
+    room_half_sizes = (room_sizes / 2).unsqueeze(1)
+    lower = (room_centers - room_half_sizes - origins).unsqueeze(1) * inverse_directions
+    upper = (room_centers + room_half_sizes - origins).unsqueeze(1) * inverse_directions
+    depth = torch.maximum(lower, upper).amin(dim=-1)
+
+    # objects: first entry of the boxes (slab test), rays starting inside a box have depth 0
+    if box_centers.shape[1]:
+        relative_centers = (box_centers - origins.unsqueeze(1)).unsqueeze(1)
+        half_sizes = (box_sizes / 2).unsqueeze(1)
+        inverse_directions = inverse_directions.unsqueeze(2)
+        lower = (relative_centers - half_sizes) * inverse_directions
+        upper = (relative_centers + half_sizes) * inverse_directions
+        entries = torch.minimum(lower, upper).amax(dim=-1)
+        exits = torch.maximum(lower, upper).amin(dim=-1)
+        hit = (exits >= entries) & (exits > 0) & box_valid.unsqueeze(1)
+        box_depth = torch.where(hit, entries.clamp(min=0), torch.full_like(entries, float("inf")))
+        depth = torch.minimum(depth, box_depth.amin(dim=-1))
+
+    return torch.minimum(depth, max_depths.unsqueeze(1))
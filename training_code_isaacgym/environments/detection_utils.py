@@ -0,0 +1,452 @@
+import math
+from typing import Callable, Dict, Optional, Tuple
+
+import torch
+
+
+# only depends on torch so that it can be tested without isaacgym (see tests/)
+
+
+def get_distance_and_angle(robot_location: torch.Tensor, robot_orientation: torch.Tensor, object_location: torch.Tensor) -> Tuple[torch.Tensor, torch.Tensor]:
+    """Calculates distance and angle of an object to the robot
+
+    Args:
+        robot_location (torch.Tensor): Absolute location of the robot (in m)
+        robot_orientation (torch.Tensor): Orientation of the robot (in radians)
+        object_location (torch.Tensor): Absolute location of the object (in m)
+
+    Returns:
+        Tuple[torch.Tensor, torch.Tensor]: Distance (in m), angle to robot (in radians)
+    """
+    # Compute distance from robot to plant
+    distance = torch.norm(object_location - robot_location)
+
+    # Compute angle from robot to plant
+    relative_position = object_location - robot_location
+    angle = torch.atan2(relative_position[1], relative_position[0]) - robot_orientation
+    angle = torch.remainder(angle + torch.pi, 2 * torch.pi) - torch.pi  # Normalize angle to [-pi, pi]
+    return distance, angle
+
+
+def get_batched_distances_and_angles(
+    robot_locations: torch.Tensor,
+    robot_orientations: torch.Tensor,
+    object_locations: torch.Tensor,
+    out: Optional[Tuple[torch.Tensor, torch.Tensor, torch.Tensor]] = None,
+) -> Tuple[torch.Tensor, torch.Tensor]:
+    """Calculates distances and angles of all objects to the robot for all environments at once.
+    Batched version of get_distance_and_angle()
+
+    Args:
+        robot_locations (torch.Tensor): Absolute locations of the robots (in m) with shape: (|environments|, 3)
+        robot_orientations (torch.Tensor): Orientations/ yaw of the robots (in radians) with shape: (|environments|)
+        object_locations (torch.Tensor): Absolute locations of the objects (in m) with shape: (|environments|, |objects|, 3)
+        out (Optional[Tuple[torch.Tensor, torch.Tensor, torch.Tensor]], optional): Preallocated relative positions, distances and angles
+            that are overwritten in place. Defaults to None (new tensors).
+
+    Returns:
+        Tuple[torch.Tensor, torch.Tensor]: Distances (in m), angles to robot (in radians) with shape: (|environments|, |objects|)
+    """
+    relative_positions, distances, angles = out if out is not None else (None, None, None)
+    relative_positions = torch.sub(object_locations, robot_locations.unsqueeze(1), out=relative_positions)
+    distances = torch.linalg.vector_norm(relative_positions, dim=-1, out=distances)
+
+    angles = torch.atan2(relative_positions[..., 1], relative_positions[..., 0], out=angles)
+    angles.sub_(robot_orientations.unsqueeze(1))
+    angles.add_(torch.pi).remainder_(2 * torch.pi).sub_(torch.pi)  # Normalize angle to [-pi, pi]
+    return distances, angles
+
+
+class ObjectDetections:
+    def __init__(self, num_envs: int, class_id: int, device: str, k: int = 1, nearest_first: bool = False) -> None:
+        """Preallocated top-k detections of a single object class (e.g. plants) for all environments (most likely first).
+        The tensors are reused and overwritten in place on every detection step.
+
+        Args:
+            num_envs (int): Number of environments
+            class_id (int): Type index of the detected objects (see ObjectType)
+            device (str): Device for tensors
+            k (int, optional): Number of detected objects per environment. Defaults to 1.
+            nearest_first (bool, optional): Sorts detected objects by distance instead of their order in the scene. Defaults to False.
+        """
+        self.num_envs: int = num_envs
+        self.class_id: int = class_id
+        self.k: int = k
+        self.nearest_first: bool = nearest_first
+        self.device = device
+
+        self.probabilities = torch.zeros(num_envs, k, device=device)
+        self.distances = torch.zeros(num_envs, k, device=device)
+        self.angles = torch.zeros(num_envs, k, device=device)
+        self.locations = torch.zeros(num_envs, k, 3, device=device)
+        self.object_classes = torch.full((num_envs, k), -1, dtype=torch.long, device=device)
+        """Type index of the detected objects (see ObjectType) or -1 if nothing is detected"""
+        # preallocated outputs of torch.topk() in detect_most_likely_objects()
+        self.scores = torch.zeros(num_envs, k, device=device)
+        self.indices = torch.zeros(num_envs, k, dtype=torch.long, device=device)
+        self.observations = torch.zeros(num_envs, k, 3, device=device)
+        """Probability, visible distance and visible angle per detection (see get_detection_observations())"""
+        # per object buffers of detect_most_likely_objects() (allocated on the first detection, see workspace())
+        self._workspace: Dict[str, torch.Tensor] = {}
+
+        # views on the most likely detection
+        self.probability = self.probabilities[:, 0]
+        self.distance = self.distances[:, 0]
+        self.angle = self.angles[:, 0]
+        self.location = self.locations[:, 0]
+        self.object_class = self.object_classes[:, 0]
+
+    def workspace(self, name: str, num_objects: int, *shape: int, dtype: torch.dtype = torch.float) -> torch.Tensor:
+        """Returns a buffer with shape (|environments|, num_objects, *shape) that is reused by all detection steps
+        (reallocated only if the number of objects changes)
+
+        Args:
+            name (str): Name of the buffer
+            num_objects (int): Number of objects (or candidates) per environment
+            dtype (torch.dtype, optional): Dtype of the buffer. Defaults to torch.float.
+
+        Returns:
+            torch.Tensor: Buffer (content of the last detection step)
+        """
+        buffer = self._workspace.get(name)
+        if buffer is None or buffer.shape[1] != num_objects:
+            buffer = torch.empty(self.num_envs, num_objects, *shape, dtype=dtype, device=self.device)
+            self._workspace[name] = buffer
+        return buffer
+
+    def clear(self):
+        """Sets all detections to the dummy detection (nothing detected)"""
+        self.probabilities.zero_()
+        self.distances.zero_()
+        self.angles.zero_()
+        self.locations.zero_()
+        self.object_classes.fill_(-1)
+        self.observations.zero_()
+
+
+def get_occluded_objects(
+    robot_locations: torch.Tensor,
+    object_locations: torch.Tensor,
+    occluder_locations: torch.Tensor,
+    occluder_sizes: torch.Tensor,
+    occluder_valid: torch.Tensor,
+) -> torch.Tensor:
+    """Tests for all environments at once whether the line of sight from the robot to an object intersects an occluder
+    (AABB in the x-y plane, e.g. chairs in front of plants).
+
+    Args:
+        robot_locations (torch.Tensor): Absolute locations of the robots (in m) with shape: (|environments|, 3)
+        object_locations (torch.Tensor): Absolute locations of the objects with shape: (|environments|, |objects|, 3)
+        occluder_locations (torch.Tensor): Absolute locations of the occluders with shape: (|environments|, |occluders|, 3)
+        occluder_sizes (torch.Tensor): Sizes (AABB) of the occluders with shape: (|environments|, |occluders|, 3)
+        occluder_valid (torch.Tensor): Occluders that block the line of sight with shape: (|environments|, |occluders|)
+
+    Returns:
+        torch.Tensor: Occluded objects with shape: (|environments|, |objects|)
+    """
+    if occluder_locations.numel() == 0 or object_locations.numel() == 0:
+        return torch.zeros(object_locations.shape[:2], dtype=torch.bool, device=object_locations.device)
+
+    origins = robot_locations[:, None, None, :2]
+    # segment from the robot (t = 0) to the object (t = 1) with shape: (|environments|, |objects|, 1, 2)
+    directions = (object_locations[..., :2] - robot_locations[:, None, :2]).unsqueeze(2)
+    directions = torch.where(directions.abs() < 1e-6, torch.full_like(directions, 1e-6), directions)
+    inverse_directions = 1.0 / directions
+    centers = occluder_locations[:, None, :, :2]
+    half_sizes = occluder_sizes[:, None, :, :2] / 2
+    # slab test with shape: (|environments|, |objects|, |occluders|)
+    lower = (centers - half_sizes - origins) * inverse_directions
+    upper = (centers + half_sizes - origins) * inverse_directions
+    entries = torch.minimum(lower, upper).amax(dim=-1)
+    exits = torch.maximum(lower, upper).amin(dim=-1)
+    intersections = (exits >= entries) & (exits > 0) & (entries < 1) & occluder_valid.unsqueeze(1)
+    return intersections.any(dim=-1)
+
+
+UINT32_MASK = 0xFFFFFFFF
+
+
+def _multiply_uint32(values: torch.Tensor, factor: int) -> torch.Tensor:
+    """Multiplies unsigned 32 bit integers (stored as int64) modulo 2^32 without int64 overflows (16 bit halves of the factor)"""
+    return (values * (factor & 0xFFFF) + (((values * (factor >> 16)) & 0xFFFF) << 16)) & UINT32_MASK
+
+
+def hash_uint32(values: torch.Tensor) -> torch.Tensor:
+    """Integer hash (lowbias32) of unsigned 32 bit integers stored as int64 tensor (values in [0, 2^32)).
+    Used as counter based random number generator: hashes of different counters are independent uniform integers.
+
+    Args:
+        values (torch.Tensor): Integers in [0, 2^32) with dtype torch.long
+
+    Returns:
+        torch.Tensor: Hashes in [0, 2^32) with the same shape
+    """
+    values = values ^ (values >> 16)
+    values = _multiply_uint32(values, 0x7FEB352D)
+    values = values ^ (values >> 15)
+    values = _multiply_uint32(values, 0x846CA68B)
+    return values ^ (values >> 16)
+
+
+class DetectionNoise:
+    def __init__(
+        self,
+        num_envs: int,
+        fov_angle: float,
+        device: str,
+        distance_noise: float = 0.1,
+        angle_noise: float = 0.05,
+        dropout_probability: float = 0.1,
+        false_positive_probability: float = 0.02,
+        false_positive_max_distance: float = 4.0,
+        seed: int = 0,
+    ) -> None:
+        """YOLO-like noise of the simulated detections (see detect_most_likely_objects()): distance proportional gaussian error,
+        gaussian angle jitter, dropouts of visible objects and spurious detections within the field of view.
+        Every environment has its own counter based random stream: samples are hashes of (seed, environment id, draw, sample index)
+        (see hash_uint32()), so the noise of an environment does not depend on the number of environments, on resets of
+        other environments or on other consumers of the global random state, and all streams are drawn at once.
+
+        Args:
+            num_envs (int): Number of environments
+            fov_angle (float): Half of the horizontal field of view (in radians)
+            device (str): Device for tensors
+            distance_noise (float, optional): Standard deviation of the distance error relative to the distance. Defaults to 0.1.
+            angle_noise (float, optional): Standard deviation of the angle error (in radians). Defaults to 0.05.
+            dropout_probability (float, optional): Probability that a visible object is not detected. Defaults to 0.1.
+            false_positive_probability (float, optional): Probability of a spurious detection per environment and detection. Defaults to 0.02.
+            false_positive_max_distance (float, optional): Maximum distance of spurious detections (in m). Defaults to 4.0.
+            seed (int, optional): Seed of the random streams. Defaults to 0.
+        """
+        self.num_envs = num_envs
+        self.fov_angle = fov_angle
+        self.distance_noise = distance_noise
+        self.angle_noise = angle_noise
+        self.dropout_probability = dropout_probability
+        self.false_positive_probability = false_positive_probability
+        self.false_positive_max_distance = false_positive_max_distance
+        seed_key = int(hash_uint32(torch.tensor(seed & UINT32_MASK)))
+        self.env_keys = hash_uint32(torch.arange(num_envs, dtype=torch.long, device=device) ^ seed_key)
+        """Key of the random stream of each environment with shape: (|environments|)"""
+        self.num_draws = 0
+        """Counter of the draws (shared by all environments, incremented by every draw)"""
+
+    def _draw_bits(self, num_samples: int) -> torch.Tensor:
+        """Draws the next random integers in [0, 2^23) of the random stream of each environment
+        (23 bits so that the samples below are exactly representable as float32)"""
+        draw = (self.num_draws ^ (self.num_draws >> 32)) & UINT32_MASK
+        self.num_draws += 1
+        draw_keys = hash_uint32(self.env_keys ^ draw)
+        sample_ids = torch.arange(num_samples, dtype=torch.long, device=draw_keys.device)
+        return hash_uint32(draw_keys.unsqueeze(1) ^ sample_ids) >> 9
+
+    def uniform(self, num_samples: int) -> torch.Tensor:
+        """Draws the next uniform samples of the random stream of each environment
+
+        Args:
+            num_samples (int): Number of samples per environment
+
+        Returns:
+            torch.Tensor: Uniform samples in (0, 1) with shape: (|environments|, num_samples)
+        """
+        return (self._draw_bits(num_samples).float() + 0.5) / (1 << 23)
+
+    def normal(self, num_samples: int) -> torch.Tensor:
+        """Draws the next standard normal samples of the random stream of each environment
+
+        Args:
+            num_samples (int): Number of samples per environment
+
+        Returns:
+            torch.Tensor: Standard normal samples with shape: (|environments|, num_samples)
+        """
+        # inverse transform sampling of independent samples in (-1, 1) (odd numerators, exact in float32)
+        centered = (2 * self._draw_bits(num_samples) + 1 - (1 << 23)).float() / (1 << 23)
+        return torch.erfinv(centered) * math.sqrt(2)
+
+    def apply(
+        self,
+        robot_locations: torch.Tensor,
+        robot_orientations: torch.Tensor,
+        object_locations: torch.Tensor,
+        distances: torch.Tensor,
+        angles: torch.Tensor,
+        visible: torch.Tensor,
+    ) -> Tuple[torch.Tensor, torch.Tensor, torch.Tensor, torch.Tensor]:
+        """Adds noise to exact detections of all environments and appends one spurious detection candidate per environment
+
+        Args:
+            robot_locations (torch.Tensor): Absolute locations of the robots (in m) with shape: (|environments|, 3)
+            robot_orientations (torch.Tensor): Orientations/ yaw of the robots (in radians) with shape: (|environments|)
+            object_locations (torch.Tensor): Absolute locations of the objects with shape: (|environments|, |objects|, 3)
+            distances (torch.Tensor): Exact distances to the objects with shape: (|environments|, |objects|)
+            angles (torch.Tensor): Exact angles to the objects with shape: (|environments|, |objects|)
+            visible (torch.Tensor): Visible objects with shape: (|environments|, |objects|)
+
+        Returns:
+            Tuple[torch.Tensor, torch.Tensor, torch.Tensor, torch.Tensor]: Object locations, distances, angles and visibility
+                with one additional (spurious) object per environment
+        """
+        num_envs, num_objects = distances.shape
+        samples = self.uniform(num_objects + 3)
+        distance_errors, angle_errors = self.normal(2 * num_objects).view(num_envs, 2, num_objects).unbind(1)
+
+        distances = distances * (1 + self.distance_noise * distance_errors).clamp(min=0)
+        angles = angles + self.angle_noise * angle_errors
+        angles = torch.remainder(angles + torch.pi, 2 * torch.pi) - torch.pi
+        visible = visible & (samples[:, :num_objects] >= self.dropout_probability)
+
+        # spurious detection at a random location within the field of view
+        spurious, spurious_distances, spurious_angles = samples[:, num_objects:].unbind(1)
+        spurious_visible = spurious < self.false_positive_probability
+        spurious_distances = spurious_distances * self.false_positive_max_distance
+        spurious_angles = (2 * spurious_angles - 1) * self.fov_angle
+        spurious_orientations = robot_orientations + spurious_angles
+        spurious_locations = robot_locations + torch.stack(
+            (
+                spurious_distances * torch.cos(spurious_orientations),
+                spurious_distances * torch.sin(spurious_orientations),
+                torch.zeros_like(spurious_distances),
+            ),
+            dim=-1,
+        )
+        return (
+            torch.cat((object_locations, spurious_locations.unsqueeze(1)), dim=1),
+            torch.cat((distances, spurious_distances.unsqueeze(1)), dim=1),
+            torch.cat((angles, spurious_angles.unsqueeze(1)), dim=1),
+            torch.cat((visible, spurious_visible.unsqueeze(1)), dim=1),
+        )
+
+
+def detect_most_likely_objects(
+    robot_locations: torch.Tensor,
+    robot_orientations: torch.Tensor,
+    object_locations: torch.Tensor,
+    fov_angle: float,
+    detections: ObjectDetections,
+    valid: Optional[torch.Tensor] = None,
+    occluded: Optional[torch.Tensor] = None,
+    noise: Optional[DetectionNoise] = None,
+):
+    """Detects the k most likely objects of a single object class (e.g. plants) in all environments at once (k = detections.k).
+    Objects within the field of view have probability 1.0, all others 0.0. Detected objects are ordered like the objects
+    of the scene (most likely object of the previous per environment detection for k = 1) or nearest first if detections.nearest_first is set.
+    Missing detections (fewer than k detected objects) have all properties 0 and the object class -1.
+    Intermediate results are written into the workspace of the detections (no allocations per step without noise).
+    If noise is given, detections are perturbed and spurious detections are added (see DetectionNoise).
+
+    Args:
+        robot_locations (torch.Tensor): Absolute locations of the robots (in m) with shape: (|environments|, 3)
+        robot_orientations (torch.Tensor): Orientations/ yaw of the robots (in radians) with shape: (|environments|)
+        object_locations (torch.Tensor): Absolute locations of the objects (in m) with shape: (|environments|, |objects|, 3) (empty tensor if there are no objects)
+        fov_angle (float): Half of the horizontal field of view (in radians)
+        detections (ObjectDetections): Preallocated detections that are overwritten in place
+        valid (Optional[torch.Tensor], optional): Valid (not padded) objects with shape: (|environments|, |objects|) (see SceneBatch). Defaults to None.
+        occluded (Optional[torch.Tensor], optional): Objects that are not visible with shape: (|environments|, |objects|) (see get_occluded_objects()). Defaults to None.
+        noise (Optional[DetectionNoise], optional): Noise model of the detections. Defaults to None (exact detections).
+    """
+    if object_locations.numel() == 0:
+        detections.clear()
+        return
+
+    num_objects = object_locations.shape[1]
+    distances, angles = get_batched_distances_and_angles(
+        robot_locations,
+        robot_orientations,
+        object_locations,
+        out=(
+            detections.workspace("relative_positions", num_objects, 3),
+            detections.workspace("distances", num_objects),
+            detections.workspace("angles", num_objects),
+        ),
+    )
+    visible = detections.workspace("visible", num_objects, dtype=torch.bool)
+    torch.le(torch.abs(angles, out=detections.workspace("abs_angles", num_objects)), fov_angle, out=visible)
+    if valid is not None:
+        visible.logical_and_(valid)
+    if occluded is not None:
+        visible.masked_fill_(occluded, False)
+    if noise is not None:
+        object_locations, distances, angles, visible = noise.apply(
+            robot_locations, robot_orientations, object_locations, distances, angles, visible
+        )
+        num_objects = object_locations.shape[1]
+    k = min(detections.k, num_objects)
+
+    # visible objects first (in scene order or nearest first), the preallocated outputs are only sliced if there are fewer objects than k
+    scores = detections.workspace("scores", num_objects)
+    if detections.nearest_first:
+        torch.neg(distances, out=scores)
+    else:
+        # earlier objects of the scene first (same order as the stable sort by probability of the per environment detection)
+        torch.arange(0, -num_objects, -1, out=scores[0])
+        scores[1:].copy_(scores[0])
+    hidden = torch.logical_not(visible, out=detections.workspace("hidden", num_objects, dtype=torch.bool))
+    scores.masked_fill_(hidden, float("-inf"))
+    most_likely = detections.indices[:, :k]
+    torch.topk(scores, k, dim=1, out=(detections.scores[:, :k], most_likely))
+    detection_probabilities = detections.probabilities[:, :k]
+    probabilities = detections.workspace("probabilities", num_objects)
+    probabilities.copy_(visible)
+    torch.gather(probabilities, 1, most_likely, out=detection_probabilities)
+
+    torch.gather(distances, 1, most_likely, out=detections.distances[:, :k])
+    detections.distances[:, :k].mul_(detection_probabilities)
+    torch.gather(angles, 1, most_likely, out=detections.angles[:, :k])
+    detections.angles[:, :k].mul_(detection_probabilities)
+    torch.gather(object_locations, 1, most_likely.unsqueeze(-1).expand(-1, -1, 3), out=detections.locations[:, :k])
+    detections.locations[:, :k].mul_(detection_probabilities.unsqueeze(-1))
+    # class id for detected objects and -1 for missing detections (probabilities are 0 or 1)
+    detections.object_classes[:, :k].copy_(detection_probabilities).mul_(detections.class_id + 1).sub_(1)
+
+
+def get_detection_observations(detections: ObjectDetections, k: int) -> torch.Tensor:
+    """Observation block of the k most likely detections (probability, visible distance and visible angle per object).
+    Distance and angle are multiplied by the probability, missing detections are all 0.
+    The block is written in place into detections.observations.
+
+    Args:
+        detections (ObjectDetections): Detections (see detect_most_likely_objects())
+        k (int): Number of observed detections (at most detections.k)
+
+    Returns:
+        torch.Tensor: View on detections.observations with shape: (|environments|, k, 3)
+    """
+    observations = detections.observations[:, :k]
+    probabilities = detections.probabilities[:, :k]
+    observations[..., 0].copy_(probabilities)
+    torch.mul(detections.distances[:, :k], probabilities, out=observations[..., 1])
+    torch.mul(detections.angles[:, :k], probabilities, out=observations[..., 2])
+    return observations
+
+
+class FeatureCache:
+    def __init__(self, compute_features: Callable[[], Dict[str, torch.Tensor]]) -> None:
+        """Caches features that are derived from the detections (e.g. exp(-distance))
+        so that they are only computed once per detection and shared by all reward functions and observations.
+
+        Args:
+            compute_features (Callable[[], Dict[str, torch.Tensor]]): Function that computes all features
+        """
+        self.compute_features = compute_features
+        self.key: Optional[int] = None
+        self.features: Dict[str, torch.Tensor] = {}
+        self.hits: int = 0
+        self.misses: int = 0
+
+    def get(self, key: int) -> Dict[str, torch.Tensor]:
+        """Returns the cached features and recomputes them if the key changed
+
+        Args:
+            key (int): Version of the inputs the features are derived from (e.g. counter of detections)
+
+        Returns:
+            Dict[str, torch.Tensor]: Features (tensors with shape: (|environments|))
+        """
+        if key == self.key:
+            self.hits += 1
+        else:
+            self.misses += 1
+            self.features = self.compute_features()
+            self.key = key
+        return self.features
@@ -0,0 +1,79 @@
+from typing import TYPE_CHECKING, Dict, List, Tuple
+
+import torch
+
+if TYPE_CHECKING:
+    from .utils import SceneBatch
+
+
+# only depends on torch so that it can be tested without isaacgym (see tests/)
+
+
+def get_object_body_weights(
+    scene_batch: "SceneBatch", scene_body_counts: List[List[int]], type_weights: Dict[str, float], device: str
+) -> torch.Tensor:
+    """Creates the collision weight of every rigid body of the static objects of each environment (in the order of the
+    contact force tensor, padded bodies have a weight of 0). The weights are normalized so that unit weights result in
+    the mean absolute x-y force over all object bodies of an environment.
+
+    Args:
+        scene_batch (SceneBatch): Static objects of all scenes
+        scene_body_counts (List[List[int]]): Number of rigid bodies of each static object of each scene
+        type_weights (Dict[str, float]): Weight per object type (types that are not included have a weight of 1.0)
+        device (str): Device of the returned tensor
+
+    Returns:
+        torch.Tensor: Weights with shape (|environments|, |max object bodies|)
+    """
+    max_bodies = max(sum(body_counts) for body_counts in scene_body_counts)
+    weights = torch.zeros(len(scene_batch.env_scene_ids), max_bodies, dtype=torch.float, device=device)
+    for scene, body_counts, env_ids in zip(scene_batch.scenes, scene_body_counts, scene_batch.scene_env_ids):
+        object_weights = torch.tensor([type_weights.get(object_type, 1.0) for object_type in scene.types], dtype=torch.float, device=device)
+        body_weights = torch.repeat_interleave(object_weights, torch.tensor(body_counts, dtype=torch.long, device=device))
+        weights[env_ids, : len(body_weights)] = body_weights / max(2 * len(body_weights), 1)
+    return weights
+
+
+@torch.jit.script
+def weighted_collision_penalty(
+    object_forces: torch.Tensor, object_force_baseline: torch.Tensor, body_weights: torch.Tensor
+) -> torch.Tensor:
+    """Per environment weighted sum of the absolute contact forces on object bodies in the x-y plane relative to a baseline
+
+    Args:
+        object_forces (torch.Tensor): Contact forces of object bodies with shape (|environments|, |object bodies|, 3)
+        object_force_baseline (torch.Tensor): x-y baseline forces with shape (|environments|, |object bodies|, 2)
+        body_weights (torch.Tensor): Weight of each object body with shape (|environments|, |object bodies|) or (|object bodies|)
+
+    Returns:
+        torch.Tensor: Penalty with shape (|environments|)
+    """
+    # elementwise chain is fused by the TorchScript fuser on the gpu
+    return torch.sum(torch.abs(object_forces[:, :, :2] - object_force_baseline) * body_weights.unsqueeze(-1), dim=(1, 2))
+
+
+@torch.jit.script
+def detection_reward_terms(
+    plant_probability: torch.Tensor,
+    plant_distance: torch.Tensor,
+    plant_angle: torch.Tensor,
+    obstacle_probability: torch.Tensor,
+    obstacle_distance: torch.Tensor,
+) -> Tuple[torch.Tensor, torch.Tensor, torch.Tensor]:
+    """Computes the unscaled detection based reward terms of HighLevelPlantPolicyLeggedRobot in one scripted pass
+    (single source of the plant_closeness, obstacle_closeness and plant_ahead rewards, see _compute_detection_features())
+
+    Args:
+        plant_probability (torch.Tensor): Probability of the most likely plant with shape (|environments|)
+        plant_distance (torch.Tensor): Distance to the most likely plant with shape (|environments|)
+        plant_angle (torch.Tensor): Angle to the most likely plant with shape (|environments|)
+        obstacle_probability (torch.Tensor): Probability of the most likely obstacle with shape (|environments|)
+        obstacle_distance (torch.Tensor): Distance to the most likely obstacle with shape (|environments|)
+
+    Returns:
+        Tuple[torch.Tensor, torch.Tensor, torch.Tensor]: plant_closeness, obstacle_closeness and plant_ahead with shape (|environments|)
+    """
+    plant_closeness = (torch.exp(-plant_distance * 0.5) + torch.exp(-plant_distance * 2.5)) * plant_probability
+    obstacle_closeness = (obstacle_distance < 1.5).float() * torch.exp(-obstacle_distance) * obstacle_probability
+    plant_ahead = torch.exp(-torch.abs(plant_angle) * 2.0) * plant_probability
+    return plant_closeness, obstacle_closeness, plant_ahead
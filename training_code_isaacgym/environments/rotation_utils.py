@@ -0,0 +1,50 @@
+import torch
+
+
+# only depends on torch so that it can be tested without isaacgym (see tests/)
+
+
+def axis_angle_to_quaternion(axis_angle: torch.Tensor) -> torch.Tensor:
+    """
+    Taken from: https://github.com/facebookresearch/pytorch3d/blob/main/pytorch3d/transforms/rotation_conversions.py
+    Convert rotations given as axis/angle to quaternions.
+
+    Args:
+        axis_angle: Rotations given as a vector in axis angle form,
+            as a tensor of shape (..., 3), where the magnitude is
+            the angle turned anticlockwise in radians around the
+            vector's direction.
+
+    Returns:
+        quaternions with real part last (format of isaac gym), as tensor of shape (..., 4).
+    """
+    angles = torch.norm(axis_angle, p=2, dim=-1, keepdim=True)
+    half_angles = angles * 0.5
+    eps = 1e-6
+    small_angles = angles.abs() < eps
+    # for x small, sin(x/2) is about x/2 - (x/2)^3/6
+    # so sin(x/2)/x is about 1/2 - (x*x)/48
+    # (both branches are evaluated, small angles are replaced in the division to prevent nan)
+    safe_angles = torch.where(small_angles, torch.ones_like(angles), angles)
+    sin_half_angles_over_angles = torch.where(
+        small_angles, 0.5 - (angles * angles) / 48, torch.sin(half_angles) / safe_angles
+    )
+    return torch.cat(
+        [axis_angle * sin_half_angles_over_angles, torch.cos(half_angles)], dim=-1
+    )
+
+
+def yaw_to_quaternion(yaws: torch.Tensor) -> torch.Tensor:
+    """Converts rotations around the z axis to quaternions (fast path of axis_angle_to_quaternion() for yaw-only rotations)
+
+    Args:
+        yaws (torch.Tensor): Yaw angles (in radians) with shape: (...)
+
+    Returns:
+        torch.Tensor: Quaternions (0, 0, sin(yaw / 2), cos(yaw / 2)) with real part last with shape: (..., 4)
+    """
+    half_yaws = yaws * 0.5
+    quaternions = torch.zeros(yaws.shape + (4,), dtype=yaws.dtype, device=yaws.device)
+    torch.sin(half_yaws, out=quaternions[..., 2])
+    torch.cos(half_yaws, out=quaternions[..., 3])
+    return quaternions
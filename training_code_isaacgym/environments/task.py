@@ -1,4 +1,5 @@
-from typing import Callable
+from typing import Callable, Dict
+import math
 
 import torch
 from isaacgym import gymtorch, gymapi
@@ -53,7 +54,7 @@ class CustomLeggedRobot(CompatibleLeggedRobot):
         """
         Absolute locations of plants in each environment
         shape: (|environments| x |plants_per_env| x 3)
-        (Attribute is instantiated in self._place_static_objects())
+        (Attribute is instantiated in self._generate_static_object_layout())
         """
         self.absolute_obstacle_locations: torch.Tensor = torch.tensor([])
 
@@ -69,25 +70,30 @@ class HighLevelPlantPolicyLeggedRobot(CompatibleLeggedRobot):
             self, cfg: GO2DefaultCfg, sim_params, physics_engine, sim_device, headless
     ):
         self._prepare_camera(cfg.camera)
+        self.analytic_depth = getattr(cfg.camera, "depth_source", "camera") == "analytic"
+        """Depth observations are computed with utils.cast_depth_rays() instead of camera sensors"""
+        self.render_cameras = True
+        self.cameras_rendered = False
 
         self.absolute_plant_locations: torch.Tensor = torch.tensor([])
         """
         Absolute locations of plants in each environment
         shape: (|environments| x |plants_per_env| x 3)
-        (Attribute is instantiated in self._place_static_objects())
+        (Attribute is instantiated in self._generate_static_object_layout())
         """
         self.absolute_obstacle_locations: torch.Tensor = torch.tensor([])
+        self.fov_angle: float = torch.deg2rad(torch.tensor(120.0 / 2)).item()  # Half of 120 degrees in radians
+        cfg.env.num_observations = utils.get_num_observations(cfg)
 
         super().__init__(cfg, sim_params, physics_engine, sim_device, headless)
         # for language server purposes only
         self.cfg: GO2HighLevelPlantPolicyCfg = self.cfg
 
         # Load low-level policy
-        self.low_level_policy = utils.load_low_level_policy(cfg, sim_device)
-        # use `self.low_level_policy.act_inference(observations)`
-        # or self.low_level_policy.actor(observations) to get an action.
-        # See `ActorCritic` in rsl_rl/modules/actor_critic.py
-        self.detected_objects = self._detect_objects()
+        self.low_level_policy = utils.load_low_level_backend(cfg, sim_device)
+        # use `self.low_level_policy(observations)` to get an action.
+        # See `utils.load_low_level_backend` (the eager backend is `ActorCritic.act_inference` from rsl_rl/modules/actor_critic.py)
+        self._detect_objects()
 
 
     def _prepare_camera(self, camera):
@@ -99,7 +105,6 @@ class HighLevelPlantPolicyLeggedRobot(CompatibleLeggedRobot):
         self.camera_props.enable_tensors = camera.enable_tensors
         self.camera_props.use_collision_geometry = True
         self.third_image_index = camera.height // 3
-        self.split_width_indices = torch.linspace(0, camera.width, camera.split_to_width + 1, dtype=torch.long)
 
 
     def _init_buffers(self):
@@ -131,6 +136,15 @@ class HighLevelPlantPolicyLeggedRobot(CompatibleLeggedRobot):
             requires_grad=False,
         )
 
+        #  observations of the low-level policy (filled in place in self.compute_low_level_observations())
+        self.low_level_obs_buf = torch.zeros(
+            self.num_envs,
+            self.cfg.low_level_policy.num_observations,
+            dtype=torch.float,
+            device=self.device,
+            requires_grad=False,
+        )
+
         #  added high_level_actions buffer
         self.high_level_actions = torch.zeros(
             self.num_envs,
@@ -140,6 +154,101 @@ class HighLevelPlantPolicyLeggedRobot(CompatibleLeggedRobot):
             requires_grad=False,
         )
 
+        #  collision weight of every object body (order of self.object_forces)
+        self.object_body_weights = utils.get_object_body_weights(
+            self.scene_batch,
+            self.scene_body_counts,
+            getattr(self.cfg.rewards, "object_collision_weights", {}),
+            self.device,
+        )
+
+        #  accumulated between full post physics steps (see self._post_physics_substep())
+        self.full_post_physics_step = True
+        self.substep_reset_buf = torch.zeros(self.num_envs, dtype=torch.bool, device=self.device, requires_grad=False)
+        self.substep_object_collision = torch.zeros(self.num_envs, dtype=torch.float, device=self.device, requires_grad=False)
+        self.num_accumulated_substeps = 0
+
+        #  obstacles that occlude plants in self._detect_objects() (static sizes, obstacles without size do not occlude)
+        self.detect_occlusions = getattr(getattr(self.cfg, "detection", None), "occlusion", False)
+        self.obstacle_sizes = self.scene_batch.gather(self.scene_batch.object_sizes, self.scene_batch.obstacle_slots)
+        self.occluding_obstacles = self.scene_batch.obstacle_valid & (self.obstacle_sizes[..., :2] > 0).all(dim=-1)
+        #  most likely detected plants and obstacles per environment (overwritten in place by self._detect_objects())
+        #  (rewards use the most likely plant and obstacle even if they are not observed)
+        detection = getattr(self.cfg, "detection", None)
+        self.num_observed_plants = getattr(detection, "num_plants", 1)
+        self.num_observed_obstacles = getattr(detection, "num_obstacles", 0)
+        self.detected_objects = utils.DetectionBatch(
+            self.num_envs,
+            self.device,
+            max(self.num_observed_plants, 1),
+            max(self.num_observed_obstacles, 1),
+            getattr(detection, "nearest_first", False),
+        )
+        #  noise of the detections (None: exact detections)
+        self.detection_noise = None
+        if getattr(detection, "noise", False):
+            self.detection_noise = utils.DetectionNoise(
+                self.num_envs,
+                self.fov_angle,
+                self.device,
+                distance_noise=detection.distance_noise,
+                angle_noise=detection.angle_noise,
+                dropout_probability=detection.dropout_probability,
+                false_positive_probability=detection.false_positive_probability,
+                false_positive_max_distance=detection.false_positive_max_distance,
+                seed=detection.noise_seed,
+            )
+        #  high-level observations (filled in place in self.compute_observations(), layout see utils.get_num_observations())
+        self.high_level_obs_buf = torch.zeros(
+            self.num_envs, self.num_obs, dtype=torch.float, device=self.device, requires_grad=False
+        )
+        #  features derived from detections, shared by rewards and observations (recomputed once per detection)
+        #  (self.detection_version is incremented by self._detect_objects() and is the key of self.feature_cache)
+        self.detection_version = 0
+        self.feature_cache = utils.FeatureCache(self._compute_detection_features)
+
+        #  sector of each depth image column for pooling depth observations
+        self.depth_sector_indices = utils.get_depth_sector_indices(
+            self.cfg.camera.width, self.cfg.camera.split_to_width, self.device
+        )
+        #  last depth observations (cached between camera renderings)
+        self.depth_observations = torch.zeros(
+            self.num_envs, self.cfg.camera.split_to_width, dtype=torch.float, device=self.device, requires_grad=False
+        )
+        if self.analytic_depth:
+            self._init_analytic_depth_buffers()
+            return
+        self.depth_readback_chunk_size = self.cfg.camera.envs_per_depth_readback or self.num_envs
+        self.depth_readback_start = 0
+        #  middle third of the depth images of all cameras (filled in place in self._update_depth_observations())
+        self.depth_buffer = torch.zeros(
+            self.num_envs,
+            self.third_image_index,
+            self.cfg.camera.width,
+            dtype=torch.float,
+            device=self.device,
+            requires_grad=False,
+        )
+
+    def _init_analytic_depth_buffers(self):
+        """Initializes the constant inputs of utils.cast_depth_rays() for the analytic depth sensor"""
+        camera = self.cfg.camera
+        self.depth_ray_tangents = utils.get_depth_ray_tangents(
+            camera.horizontal_fov, camera.width, camera.split_to_width, camera.analytic_rays_per_sector, self.device
+        ).flatten()
+        #  the floor is visible in the lowest row of the middle third of the depth image
+        focal_length = camera.width / 2 / math.tan(math.radians(camera.horizontal_fov) / 2)
+        self.depth_floor_tangent = (2 * self.third_image_index - 0.5 - camera.height / 2) / focal_length
+        #  walls of each environment (scenes without walls have infinite size)
+        scene_wall_sizes = [
+            (getattr(scene_cfg, "wall_size", None) or scene_cfg.size)
+            if any(static_obj.type == "wall" for static_obj in scene_cfg.static_objects) else float("inf")
+            for scene_cfg in self._get_scene_cfgs()
+        ]
+        self.depth_wall_sizes = torch.tensor(scene_wall_sizes, dtype=torch.float, device=self.device)[self.scene_batch.env_scene_ids]
+        #  objects with a size are hit by rays (e.g. walls have no size)
+        self.depth_box_valid = self.scene_batch.object_valid & (self.scene_batch.object_sizes[..., :2] > 0).all(dim=-1)
+
     def _init_gain_buffers(self):
         """overwrites default initializations for compatibilty with low-level policy interactions (moved outside for super() call)
         """
@@ -158,61 +267,102 @@ class HighLevelPlantPolicyLeggedRobot(CompatibleLeggedRobot):
             high_level_actions (torch.Tensor): Tensor of shape (num_envs, num_actions_per_env)
         """
         # Base observation components combined with plant-related features
-        self.low_level_obs_buf = torch.cat(
-            (
-                self.base_lin_vel * self.obs_scales.lin_vel,
-                self.base_ang_vel * self.obs_scales.ang_vel,
-                self.projected_gravity,
-                high_level_actions,  # * self.commands_scale,
-                (self.dof_pos - self.default_dof_pos) * self.obs_scales.dof_pos,
-                self.dof_vel * self.obs_scales.dof_vel,
-                self.actions
-            ),
-            dim=-1,
-        )
+        # (written in place into the preallocated buffer, same order as in the low-level policy training)
+        obs = self.low_level_obs_buf
+        num_dof = self.num_dof
+        obs[:, 0:3].copy_(self.base_lin_vel).mul_(self.obs_scales.lin_vel)
+        obs[:, 3:6].copy_(self.base_ang_vel).mul_(self.obs_scales.ang_vel)
+        obs[:, 6:9].copy_(self.projected_gravity)
+        obs[:, 9:12].copy_(high_level_actions)  # * self.commands_scale,
+        obs[:, 12:12 + num_dof].copy_(self.dof_pos).sub_(self.default_dof_pos).mul_(self.obs_scales.dof_pos)
+        obs[:, 12 + num_dof:12 + 2 * num_dof].copy_(self.dof_vel).mul_(self.obs_scales.dof_vel)
+        obs[:, 12 + 2 * num_dof:].copy_(self.actions)
 
     # computes high level observations
     def compute_observations(self):
         """ Computes observations
         """
         # Call object detection method
-        self.detected_objects = self._detect_objects()
-        plants_across_envs = [obj["plants"] for obj in self.detected_objects]
+        self._detect_objects()
 
-        plant_probability = utils.convert_object_property(plants_across_envs, "probability", self.device).unsqueeze(1)
-        plant_distances = utils.convert_object_property(plants_across_envs, "distance", self.device).unsqueeze(1)
-        plant_angles = utils.convert_object_property(plants_across_envs, "angle", self.device).unsqueeze(1)
+        # camera depth observations are only updated if the cameras were rendered (see self.render())
+        if self.analytic_depth:
+            self._update_analytic_depth_observations()
+        elif self.cameras_rendered:
+            self._update_depth_observations()
+            self.cameras_rendered = False
+        observable_depth_information = self.depth_observations
+
+        # To train an alternative policy without depth information
+        # observable_depth_information = torch.ones_like(observable_depth_information).to(self.device)
+
+        # (written in place into the preallocated buffer, obs_buf is replaced by a clipped copy in step())
+        obs = self.high_level_obs_buf
+        features = self.feature_cache.get(self.detection_version)
+        start = 0
+        for name, num_observed in (
+            ("plant_observations", self.num_observed_plants),
+            ("obstacle_observations", self.num_observed_obstacles),
+        ):
+            obs[:, start:start + 3 * num_observed].unflatten(1, (num_observed, 3)).copy_(features[name])
+            start += 3 * num_observed
+        obs[:, start:].copy_(observable_depth_information)
+        self.obs_buf = obs
+
+    def _update_depth_observations(self):
+        """Updates self.depth_observations from the rendered camera images.
+        If camera.envs_per_depth_readback is set, only the images of the next chunk of environments are read back and pooled (round-robin)
+        and all other environments keep their last depth observation.
+        """
+        start = self.depth_readback_start
+        end = min(start + self.depth_readback_chunk_size, self.num_envs)
+        self.depth_readback_start = end % self.num_envs
 
         # Distance sensors WITH ACCESS AND END ACCESS IT actually gets GPU tensors
+        # (only the middle third of the images is copied into the preallocated depth buffer)
+        depth_buffer = self.depth_buffer[:end - start]
         self.gym.start_access_image_tensors(self.sim)
-        depth_information = -torch.stack([
-            gymtorch.wrap_tensor(
-                self.gym.get_camera_image_gpu_tensor(
-                    self.sim, self.envs[i], self.cameras[i], gymapi.IMAGE_DEPTH
-                )
-            ) for i in range(len(self.cameras))
-        ])
+        torch.stack(self.camera_depth_tensors[start:end], out=depth_buffer)
         self.gym.end_access_image_tensors(self.sim)
         # USE DEPTH INFORMATION TO CALCULATE UPPER AND LOWER IMAGE MIN VALUE
         # upper_image_min = depth_information[:, :self.half_image_idx, :].min(dim=1).values
         # lower_image_min = depth_information[:, self.half_image_idx:, :].min(dim=1).values
-        third_image = depth_information[:, self.third_image_index:2*self.third_image_index, :].min(dim=1).values
-        third_image = torch.stack(
-            [
-                third_image[:, self.split_width_indices[i]:self.split_width_indices[i+1]].min(dim=1).values
-                for i in range(self.cfg.camera.split_to_width)
-            ]
-        ).transpose(0, 1)
-        observable_depth_information = torch.tanh(third_image)
-
-        # To train an alternative policy without depth information
-        # observable_depth_information = torch.ones_like(observable_depth_information).to(self.device)
+        # depth values of the camera are negative: min(-depth) = -max(depth)
+        third_image = -utils.pool_depth_sectors(
+            depth_buffer,
+            self.cfg.camera.split_to_width,
+            reduction="max",
+            sector_indices=self.depth_sector_indices,
+        )
+        torch.tanh(third_image, out=self.depth_observations[start:end])
 
-        self.obs_buf = torch.cat((plant_probability,
-                                  torch.mul(plant_distances, plant_probability),
-                                  torch.mul(plant_angles, plant_probability),
-                                  observable_depth_information,
-                                  ), dim=-1)
+    def _update_analytic_depth_observations(self):
+        """Updates self.depth_observations of all environments with rays cast against the walls and object AABBs (see utils.cast_depth_rays()).
+        Roll and pitch of the robot are ignored, rays that do not hit walls or objects see the floor (or camera.max_depth).
+        """
+        camera = self.cfg.camera
+        orientations = self.rpy[:, 2]
+        cos, sin = torch.cos(orientations), torch.sin(orientations)
+        offset = camera.vec_from_body_center
+        origins = self.base_pos[:, :2] + torch.stack(
+            (cos * offset.x - sin * offset.y, sin * offset.x + cos * offset.y), dim=-1
+        )
+        camera_heights = self.base_pos[:, 2] + offset.z - self.env_origins[:, 2]
+        max_depths = (camera_heights / self.depth_floor_tangent).clamp(min=0, max=camera.max_depth)
+
+        depth = utils.cast_depth_rays(
+            origins,
+            orientations,
+            self.depth_ray_tangents,
+            self.static_object_locations[..., :2],
+            self.scene_batch.object_sizes[..., :2],
+            self.depth_box_valid,
+            self.env_origins[:, :2],
+            self.depth_wall_sizes,
+            max_depths,
+        )
+        sector_depth = depth.view(self.num_envs, camera.split_to_width, -1).amin(dim=-1)
+        torch.tanh(sector_depth, out=self.depth_observations)
 
     # add custom rewards... here (use your robot_cfg for control)
 
@@ -224,31 +374,15 @@ class HighLevelPlantPolicyLeggedRobot(CompatibleLeggedRobot):
 
     def _reward_plant_closeness(self):
         # Tracking of angular velocity commands (yaw)
-        plants_across_envs = [obj["plants"] for obj in self.detected_objects]
-
-        plant_probability = utils.convert_object_property(plants_across_envs, "probability", self.device)
-        plant_distances = utils.convert_object_property(plants_across_envs, "distance", self.device)
-
-        combined_reward = torch.exp(-plant_distances * 0.5) * plant_probability
-        combined_reward += torch.exp(-plant_distances * 2.5) * plant_probability
-        return combined_reward
+        return self.feature_cache.get(self.detection_version)["plant_closeness"]
 
     def _reward_obstacle_closeness(self):
         # Tracking of angular velocity commands (yaw)
-        obstacles_across_envs = [obj["obstacles"] for obj in self.detected_objects]
-
-        obstacle_probability = utils.convert_object_property(obstacles_across_envs, "probability", self.device)
-        obstacle_distances = utils.convert_object_property(obstacles_across_envs, "distance", self.device)
-        obstacle_angles = utils.convert_object_property(obstacles_across_envs, "angle", self.device)
-        return (obstacle_distances < 1.5).float() * torch.exp(-obstacle_distances) * obstacle_probability
+        return self.feature_cache.get(self.detection_version)["obstacle_closeness"]
 
     def _reward_plant_ahead(self):
         # Tracking of angular velocity commands (yaw)
-        plants_across_envs = [obj["plants"] for obj in self.detected_objects]
-
-        plant_probability = utils.convert_object_property(plants_across_envs, "probability", self.device)
-        plant_angles = utils.convert_object_property(plants_across_envs, "angle", self.device)
-        return torch.exp(-torch.abs(plant_angles)*2.0) * plant_probability
+        return self.feature_cache.get(self.detection_version)["plant_ahead"]
 
     def _reward_object_collision(self):
         """Rewards collisions with obstacles, walls and plants.
@@ -256,49 +390,112 @@ class HighLevelPlantPolicyLeggedRobot(CompatibleLeggedRobot):
 
         Does not include forces on z-axis and uses a baseline from self.reset_root_states() to tackle unexplained forces
         Returns:
-            torch.Tensor: Summed absolute contact forces on object bodies
+            torch.Tensor: Weighted mean absolute contact forces on object bodies per environment
         """
-        reward = torch.mean(torch.abs(self.object_forces[:, :, :2] - self.object_force_baseline[:, :, :2]))
+        reward = self._object_collision_penalty()
+        if self.num_accumulated_substeps:
+            # mean over all low-level steps of the high-level step (see self._post_physics_substep())
+            reward = (reward + self.substep_object_collision) / (self.num_accumulated_substeps + 1)
+            self.substep_object_collision.zero_()
+            self.num_accumulated_substeps = 0
         #print(f"{reward=}")
         return reward
 
+    def _object_collision_penalty(self):
+        """Weighted absolute contact forces on object bodies (x-y plane) relative to the baseline from self.reset_root_states()
+        per environment (weights per object type from cfg.rewards.object_collision_weights)"""
+        return utils.weighted_collision_penalty(self.object_forces, self.object_force_baseline, self.object_body_weights)
+
     def _detect_objects(self):
         """Detects objects in the environment and classifies them into obstacles and plants/targets.
         Additionally, computes angle and distance from the robot to each detected object.
         Only objects within the robot's field of view (120 degrees in both axes) are detected.
+        If cfg.detection.occlusion is set, plants behind obstacles are not detected (see utils.get_occluded_objects()).
+        If cfg.detection.noise is set, detections are perturbed like in the real detection pipeline (see utils.DetectionNoise).
+        All environments are processed at once (see utils.detect_most_likely_objects()).
+
+        The most likely plant and obstacle of each environment are written in place into self.detected_objects (utils.DetectionBatch).
+        """
+        robot_positions = self.base_pos
+        robot_orientations = self.rpy[:, 2]
+        occluded_plants = None
+        if self.detect_occlusions:
+            occluded_plants = utils.get_occluded_objects(
+                robot_positions, self.absolute_plant_locations, self.absolute_obstacle_locations, self.obstacle_sizes,
+                self.occluding_obstacles,
+            )
+        utils.detect_most_likely_objects(
+            robot_positions, robot_orientations, self.absolute_plant_locations, self.fov_angle, self.detected_objects.plants,
+            self.scene_batch.plant_valid, occluded_plants, self.detection_noise,
+        )
+        utils.detect_most_likely_objects(
+            robot_positions, robot_orientations, self.absolute_obstacle_locations, self.fov_angle, self.detected_objects.obstacles,
+            self.scene_batch.obstacle_valid, noise=self.detection_noise,
+        )
+        # derived features in self.feature_cache are recomputed on the next access
+        self.detection_version += 1
+
+    def _compute_detection_features(self) -> Dict[str, torch.Tensor]:
+        """Computes all quantities derived from self.detected_objects that are shared by rewards and observations.
+        Use `self.feature_cache.get(self.detection_version)` to access them instead of calling this function.
 
         Returns:
-            dict: A dictionary containing detected objects for each environment, their classification, distances, and angles. (only returns most likely obstacle and plant)
+            Dict[str, torch.Tensor]: Unscaled detection based reward terms with shape: (|environments|) (see utils.detection_reward_terms()), observation blocks of the top-k plants and obstacles
+                with shape: (|environments|, k, 3) (probability, visible distance and visible angle per observed object)
+        """
+        plants = self.detected_objects.plants
+        obstacles = self.detected_objects.obstacles
+        plant_closeness, obstacle_closeness, plant_ahead = utils.detection_reward_terms(
+            plants.probability, plants.distance, plants.angle, obstacles.probability, obstacles.distance
+        )
+        return {
+            "plant_closeness": plant_closeness,
+            "obstacle_closeness": obstacle_closeness,
+            "plant_ahead": plant_ahead,
+            "plant_observations": utils.get_detection_observations(plants, self.num_observed_plants),
+            "obstacle_observations": utils.get_detection_observations(obstacles, self.num_observed_obstacles),
+        }
+
+    def post_physics_step(self):
+        if self.full_post_physics_step:
+            super().post_physics_step()
+        else:
+            self._post_physics_substep()
+
+    def _post_physics_substep(self):
+        """Minimal post physics step for intermediate low-level steps of a high-level step.
+        Only the quantities needed for the low-level observations are updated. Terminations and contact-based penalties
+        are accumulated and handled in the full post physics step of the last low-level step
+        (rewards, resets and high-level observations are computed once per high-level step).
+        self._post_physics_step_callback() still runs on every low-level step, so command resampling and pushes
+        happen at their configured intervals even if they are not multiples of steps_per_high_level_action.
         """
-        detected_objects = []
-        fov_angle = torch.deg2rad(torch.tensor(120.0 / 2))  # Half of 120 degrees in radians
+        self._refresh_root_states()
+        self._refresh_contact_forces()
 
-        for env_idx in range(self.num_envs):
-            robot_position = self.base_pos[env_idx]  # Get robot position for the current environment
-            robot_orientation = self.rpy[env_idx, 2]  # Get robot yaw (orientation) for the current environment
+        self.episode_length_buf += 1
+        self.common_step_counter += 1
 
-            obstacles = [utils.get_dummy_object_observation(self.device)]
-            plants = [utils.get_dummy_object_observation(self.device)]
+        self._update_base_states()
 
-            if len(self.absolute_plant_locations):
-                for plant_location in self.absolute_plant_locations[env_idx]:
-                    distance, angle = utils.get_distance_and_angle(robot_position, robot_orientation, plant_location)
-                    probability = 1.0
-                    plants.append(utils.get_object_observation(plant_location, distance, angle, probability, fov_angle))
+        self._post_physics_step_callback()
 
-            if len(self.absolute_obstacle_locations):
-                for obstacle_location in self.absolute_obstacle_locations[env_idx]:
-                    distance, angle = utils.get_distance_and_angle(robot_position, robot_orientation, obstacle_location)
-                    probability = 1.0
-                    obstacles.append(utils.get_object_observation(obstacle_location, distance, angle, probability, fov_angle))
+        self.check_termination()
+        self.substep_reset_buf |= self.reset_buf.bool()
+        if "object_collision" in self.reward_scales:
+            self.substep_object_collision += self._object_collision_penalty()
+            self.num_accumulated_substeps += 1
 
-            detected_objects.append({
-                "env_idx": env_idx,
-                "obstacles": sorted(obstacles, key=lambda p: p["probability"], reverse=True)[:1],
-                "plants": sorted(plants, key=lambda p: p["probability"], reverse=True)[:1]
-            })
+        self.last_actions[:] = self.actions[:]
+        self.last_dof_vel[:] = self.dof_vel[:]
+        self.last_root_vel[:] = self.root_states[:, 7:13]
 
-        return detected_objects
+    def check_termination(self):
+        super().check_termination()
+        if self.full_post_physics_step:
+            # terminations of the intermediate low-level steps (see self._post_physics_substep())
+            self.reset_buf |= self.substep_reset_buf
+            self.substep_reset_buf[:] = False
 
     def step(self, high_level_actions: torch.Tensor):
         """ Apply actions, simulate, call self.post_physics_step()
@@ -317,9 +514,16 @@ class HighLevelPlantPolicyLeggedRobot(CompatibleLeggedRobot):
         bounded_high_level_actions = torch.tanh(high_level_actions)
         self.high_level_actions = bounded_high_level_actions
 
-        for _ in range(self.cfg.low_level_policy.steps_per_high_level_action):
+        num_substeps = self.cfg.low_level_policy.steps_per_high_level_action
+        for substep in range(num_substeps):
+            # only the observation of the last low-level step is returned
+            last_substep = substep == num_substeps - 1
+            self.render_cameras = last_substep or not self.cfg.camera.render_only_observed_step
+            self.full_post_physics_step = last_substep or not self.cfg.low_level_policy.minimal_substep_bookkeeping
             self.compute_low_level_observations(bounded_high_level_actions)
-            actions = self.low_level_policy.act_inference(self.low_level_obs_buf)
+            # the low-level policy is frozen
+            with torch.inference_mode():
+                actions = self.low_level_policy(self.low_level_obs_buf)
             info = super().step(actions)
         return info
 
@@ -327,6 +531,11 @@ class HighLevelPlantPolicyLeggedRobot(CompatibleLeggedRobot):
         super()._create_envs()
         # ADD Camera Functionality
         self.cameras = []
+        self.camera_depth_tensors = []
+        """Persistent views on the middle third of the camera depth images (wrapped once)"""
+        if self.analytic_depth:
+            # no camera sensors are needed (see self._update_analytic_depth_observations())
+            return
         for env_handle, actor_handle in zip(self.envs, self.actor_handles):
             camera_handle = self.gym.create_camera_sensor(env_handle, self.camera_props)
             local_transform = gymapi.Transform()
@@ -341,7 +550,15 @@ class HighLevelPlantPolicyLeggedRobot(CompatibleLeggedRobot):
             )
             self.cameras.append(camera_handle)
 
+            depth_image = gymtorch.wrap_tensor(
+                self.gym.get_camera_image_gpu_tensor(self.sim, env_handle, camera_handle, gymapi.IMAGE_DEPTH)
+            )
+            self.camera_depth_tensors.append(depth_image[self.third_image_index:2*self.third_image_index])
+
     def render(self, sync_frame_time=True):
         super().render(sync_frame_time)
-        # This renders all cameras each simulation step
-        self.gym.render_all_camera_sensors(self.sim)
+        # This renders all cameras (by default only in simulation steps whose observations are used, see self.step())
+        # (camera.envs_per_depth_readback only limits the readback, Isaac Gym has no API to render a subset of the camera sensors)
+        if self.render_cameras and not self.analytic_depth:
+            self.gym.render_all_camera_sensors(self.sim)
+            self.cameras_rendered = True
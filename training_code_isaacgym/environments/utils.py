@@ -1,40 +1,120 @@
-from typing import List, Tuple, Dict
+from typing import Any, Callable, List, Tuple, Dict, Optional
+import typing
+import hashlib
+import time
+from pathlib import Path
+import numpy as np
 import torch
 from rsl_rl.modules import ActorCritic
 from ..configs.robots.go2_high_level_policy_plant import GO2HighLevelPlantPolicyCfg
-
-
-def axis_angle_to_quaternion(axis_angle: torch.Tensor) -> torch.Tensor:
-    """
-    Taken from: https://github.com/facebookresearch/pytorch3d/blob/main/pytorch3d/transforms/rotation_conversions.py
-    Convert rotations given as axis/angle to quaternions.
-
-    Args:
-        axis_angle: Rotations given as a vector in axis angle form,
-            as a tensor of shape (..., 3), where the magnitude is
-            the angle turned anticlockwise in radians around the
-            vector's direction.
-
-    Returns:
-        quaternions with real part first, as tensor of shape (..., 4).
-    """
-    angles = torch.norm(axis_angle, p=2, dim=-1, keepdim=True)
-    half_angles = angles * 0.5
-    eps = 1e-6
-    small_angles = angles.abs() < eps
-    sin_half_angles_over_angles = torch.empty_like(angles)
-    sin_half_angles_over_angles[~small_angles] = (
-        torch.sin(half_angles[~small_angles]) / angles[~small_angles]
-    )
-    # for x small, sin(x/2) is about x/2 - (x/2)^3/6
-    # so sin(x/2)/x is about 1/2 - (x*x)/48
-    sin_half_angles_over_angles[small_angles] = (
-        0.5 - (angles[small_angles] * angles[small_angles]) / 48
-    )
-    quaternions = torch.cat(
-        [torch.cos(half_angles), axis_angle * sin_half_angles_over_angles], dim=-1
-    )
-    return quaternions[:, [1, 2, 3, 0]] # changed for correct format
+from ..configs.scenes import ObjectType, StaticObject, LayoutSampler
+from .depth_utils import get_depth_sector_indices, pool_depth_sectors, get_depth_ray_tangents, cast_depth_rays
+from .rotation_utils import axis_angle_to_quaternion, yaw_to_quaternion
+from .reward_utils import get_object_body_weights, weighted_collision_penalty, detection_reward_terms
+from .detection_utils import (
+    get_distance_and_angle,
+    get_batched_distances_and_angles,
+    ObjectDetections,
+    get_occluded_objects,
+    DetectionNoise,
+    detect_most_likely_objects,
+    get_detection_observations,
+    FeatureCache,
+)
+
+__all__ = [
+    # placement
+    "ROBOT_SIZE",
+    "SceneTensor",
+    "calculate_random_location",
+    "validate_locations",
+    "SpatialHashGrid",
+    "generate_scene_layout",
+    "SceneBatch",
+    "get_index_table",
+    "get_scene_fingerprint",
+    "get_layout_snapshot_path",
+    "save_layout_snapshot",
+    "load_layout_snapshot",
+    # assets
+    "get_options_fingerprint",
+    "AssetCache",
+    # low-level policy
+    "load_low_level_policy",
+    "LowLevelActor",
+    "get_file_hash",
+    "get_low_level_cache_path",
+    "load_cached_low_level_policy",
+    "save_cached_low_level_policy",
+    "load_low_level_backend",
+    # observations and detections
+    "DetectionBatch",
+    "get_num_observations",
+    "get_distance_and_angle",
+    "get_batched_distances_and_angles",
+    "ObjectDetections",
+    "get_occluded_objects",
+    "DetectionNoise",
+    "detect_most_likely_objects",
+    "get_detection_observations",
+    "FeatureCache",
+    # depth
+    "get_depth_sector_indices",
+    "pool_depth_sectors",
+    "get_depth_ray_tangents",
+    "cast_depth_rays",
+    # rotations
+    "axis_angle_to_quaternion",
+    "yaw_to_quaternion",
+    # rewards
+    "get_object_body_weights",
+    "weighted_collision_penalty",
+    "detection_reward_terms",
+]
+
+
+ROBOT_SIZE = 0.8  # TODO size of robot
+"""Minimal distance (in m) of randomly placed objects to the robot in x and y direction"""
+
+
+class SceneTensor:
+    def __init__(self, static_objects: List[StaticObject], device: str) -> None:
+        """Struct of arrays of the static objects of a scene (compiled once from BaseSceneCfg.static_objects).
+        Placement, detection and rewards use these tensors instead of iterating over the static objects.
+
+        Args:
+            static_objects (List[StaticObject]): Static objects of the scene
+            device (str): Device for tensors
+        """
+        object_types = typing.get_args(ObjectType)
+        self.num_objects: int = len(static_objects)
+        self.names: List[str] = [static_obj.name for static_obj in static_objects]
+        self.types: List[str] = [static_obj.type for static_obj in static_objects]
+        self.segmentation_ids: List[int] = [static_obj.segmentation_id for static_obj in static_objects]
+
+        def stack(attribute: str) -> torch.Tensor:
+            if not static_objects:
+                return torch.zeros(0, 3, dtype=torch.float, device=device)
+            return torch.stack([getattr(static_obj, attribute).float().cpu() for static_obj in static_objects]).to(device)
+
+        self.init_locations = stack("init_location")
+        """Mean locations relative to the env origin with shape: (|objects|, 3)"""
+        self.max_random_loc_offsets = stack("max_random_loc_offset")
+        """Maximum random offsets from init_locations with shape: (|objects|, 3)"""
+        self.sizes = stack("size")
+        """Sizes (AABB) with shape: (|objects|, 3)"""
+        self.type_ids = torch.tensor([object_types.index(object_type) for object_type in self.types], dtype=torch.long, device=device)
+        """Index of the type in ObjectType with shape: (|objects|)"""
+        self.random_mask = self.max_random_loc_offsets.any(dim=-1)
+        """Randomly placed objects with shape: (|objects|)"""
+        self.plant_mask = self.type_ids == object_types.index("flower_pot")
+        self.obstacle_mask = self.type_ids == object_types.index("obstacle")
+        self.random_indices = self.random_mask.nonzero(as_tuple=False).flatten()
+        self.fixed_indices = (~self.random_mask).nonzero(as_tuple=False).flatten()
+        self.plant_indices = self.plant_mask.nonzero(as_tuple=False).flatten()
+        self.obstacle_indices = self.obstacle_mask.nonzero(as_tuple=False).flatten()
+        # used as python ints in the placement loop (prevents device synchronisations)
+        self._random_indices_list: List[int] = self.random_indices.tolist()
 
 
 def calculate_random_location(
@@ -60,126 +140,513 @@ def calculate_random_location(
     return init_location + location_offset + random_loc_offset
 
 
-def validate_location(
-    object,
-    location: torch.Tensor,
-    robot_location: torch.Tensor,
-    other_object_locations: List[torch.Tensor],
-    other_object_sizes: List[torch.Tensor],
-) -> bool:
-    """Classifies whether location is allowed meaning that object does not collide with other objects or the robot.
+def validate_locations(
+    locations: torch.Tensor,
+    size: torch.Tensor,
+    robot_locations: torch.Tensor,
+    other_object_locations: torch.Tensor,
+    other_object_sizes: torch.Tensor,
+) -> torch.Tensor:
+    """Classifies for a batch of candidate locations whether they are allowed meaning that the object does not collide with other objects or the robot.
+    Collisions are detected by overlapping axis aligned bounding boxes (AABB) in the x-y plane.
     **Be aware:**
     It does not detect collisions with walls!
     The z axis is also not checked
 
     Args:
-        object (StaticObject): Object that should be placed into scene
-        location (torch.Tensor): Actual location of the object
-        robot_location (torch.Tensor): Location of the robot in scene at initialisation
-        other_object_locations (List[torch.Tensor]): Locations of objects that are already inserted in scene
-        other_object_sizes (List[torch.Tensor]): Sizes of objects that are already inserted in scene
+        locations (torch.Tensor): Candidate locations of the object with shape: (|environments|, |candidates|, 3)
+        size (torch.Tensor): Size of the object that should be placed into the scene with shape: (3)
+        robot_locations (torch.Tensor): Locations of the robots at initialisation with shape: (|environments|, 3)
+        other_object_locations (torch.Tensor): Locations of objects that are already inserted in scene with shape: (|environments|, |other objects|, 3)
+        other_object_sizes (torch.Tensor): Sizes of objects that are already inserted in scene with shape: (|other objects|, 3)
+
+    Returns:
+        torch.Tensor: True if no collision found else False with shape: (|environments|, |candidates|)
+    """
+    robot_distances = torch.abs(locations - robot_locations.unsqueeze(1))[..., :2]
+    valid = ~(robot_distances < ROBOT_SIZE).all(dim=-1)
+    if other_object_locations.shape[1] == 0:
+        return valid
+
+    # pairwise distances with shape: (|environments|, |candidates|, |other objects|, 2)
+    object_distances = torch.abs(locations.unsqueeze(2) - other_object_locations.unsqueeze(1))[..., :2]
+    min_object_distances = ((other_object_sizes + size) / 2)[:, :2]
+    collisions = (object_distances < min_object_distances).all(dim=-1).any(dim=-1)
+    return valid & ~collisions
+
+
+class SpatialHashGrid:
+    def __init__(
+        self,
+        num_envs: int,
+        lower: torch.Tensor,
+        upper: torch.Tensor,
+        cell_size: float,
+        device: str,
+        capacity: int = 2,
+    ) -> None:
+        """Uniform grid (per environment) of the axis aligned bounding boxes (AABB) of the randomly placed objects in the x-y plane.
+        Every object is stored in all cells its AABB overlaps. If the cell size is larger than the largest object, an AABB
+        overlaps at most 2x2 cells and two objects can only collide if they share a cell, so candidates are only checked
+        against the objects in the cells they overlap instead of all placed objects (exact AABB overlap like validate_locations()).
+        Locations outside of the grid are clamped to the border cells.
+
+        Args:
+            num_envs (int): Number of environments
+            lower (torch.Tensor): Lower x-y bound of the grid relative to the env origin with shape: (2)
+            upper (torch.Tensor): Upper x-y bound of the grid relative to the env origin with shape: (2)
+            cell_size (float): Edge length of a grid cell (in m)
+            device (str): Device for tensors
+            capacity (int, optional): Initial number of objects per cell (doubled when a cell is full). Defaults to 2.
+        """
+        self.lower = lower.to(device)
+        self.cell_size = cell_size
+        self.shape = torch.ceil((upper.to(device) - self.lower) / cell_size).long().clamp(min=1).tolist()
+        self.bounds = self._empty_bounds(num_envs, self.shape[0] * self.shape[1], capacity, device)
+        """Bounds (x_min, y_min, x_max, y_max) relative to the env origin of the objects in each cell with shape: (|environments|, |cells|, capacity, 4)"""
+        self.counts = torch.zeros(num_envs, self.shape[0] * self.shape[1], dtype=torch.long, device=device)
+        """Number of objects in each cell with shape: (|environments|, |cells|)"""
+
+    @staticmethod
+    def _empty_bounds(num_envs: int, num_cells: int, capacity: int, device: str) -> torch.Tensor:
+        # empty slots (min = inf, max = -inf) never overlap
+        bounds = torch.full((num_envs, num_cells, capacity, 4), float("inf"), dtype=torch.float, device=device)
+        bounds[..., 2:] = -float("inf")
+        return bounds
+
+    @staticmethod
+    def from_scene(scene: SceneTensor, num_envs: int, device: str) -> Optional["SpatialHashGrid"]:
+        """Creates a grid that covers all possible AABBs of the randomly placed static objects
+
+        Args:
+            scene (SceneTensor): Static objects of the scene
+            num_envs (int): Number of environments
+            device (str): Device for tensors
+
+        Returns:
+            Optional[SpatialHashGrid]: Grid or None if there are no randomly placed objects with a size
+        """
+        if not len(scene.random_indices):
+            return None
+        random_sizes = scene.sizes[scene.random_indices, :2]
+        max_size = random_sizes.max().item()
+        if max_size <= 0:
+            return None
+        init_locations = scene.init_locations[scene.random_indices, :2]
+        max_offsets = scene.max_random_loc_offsets[scene.random_indices, :2]
+        lower = (init_locations - max_offsets - random_sizes / 2).min(dim=0).values.cpu()
+        upper = (init_locations + max_offsets + random_sizes / 2).max(dim=0).values.cpu()
+        # margin for rounding errors, so that an AABB never overlaps more than 2 cells per axis
+        return SpatialHashGrid(num_envs, lower, upper, max_size * 1.01, device)
+
+    def cell_indices(self, bounds: torch.Tensor) -> torch.Tensor:
+        """Computes the (flattened) indices of the 2x2 cells that are overlapped by AABBs
+        (cells are repeated if an AABB overlaps only one cell in a direction)
+
+        Args:
+            bounds (torch.Tensor): Bounds (x_min, y_min, x_max, y_max) relative to the env origins with shape: (|environments|, ..., 4)
+
+        Returns:
+            torch.Tensor: Cell indices with shape: (|environments|, ..., 4)
+        """
+        cells = torch.floor((bounds.unflatten(-1, (2, 2)) - self.lower) / self.cell_size).long()
+        cells[..., 0].clamp_(0, self.shape[0] - 1)
+        cells[..., 1].clamp_(0, self.shape[1] - 1)
+        # (lower x, lower y), (lower x, upper y), (upper x, lower y), (upper x, upper y)
+        return cells[..., 0].repeat_interleave(2, dim=-1) * self.shape[1] + torch.cat([cells[..., 1], cells[..., 1]], dim=-1)
+
+    def validate(self, bounds: torch.Tensor, cell_indices: torch.Tensor) -> torch.Tensor:
+        """Classifies whether candidate AABBs are free meaning that they do not overlap any object in the cells they overlap
+
+        Args:
+            bounds (torch.Tensor): Bounds of the candidates relative to the env origins with shape: (|environments|, |candidates|, 4)
+            cell_indices (torch.Tensor): Cell indices of the candidates (see cell_indices()) with shape: (|environments|, |candidates|, 4)
+
+        Returns:
+            torch.Tensor: True if the candidate is free else False with shape: (|environments|, |candidates|)
+        """
+        num_envs, num_candidates = cell_indices.shape[:2]
+        capacity = self.bounds.shape[2]
+        slots = (cell_indices.unsqueeze(-1) * capacity + torch.arange(capacity, device=cell_indices.device)).view(num_envs, -1, 1)
+        neighbours = self.bounds.view(num_envs, -1, 4).gather(1, slots.expand(-1, -1, 4)).view(num_envs, num_candidates, -1, 4)
+        overlaps = (bounds[..., None, :2] < neighbours[..., 2:]) & (neighbours[..., :2] < bounds[..., None, 2:])
+        return ~overlaps.all(dim=-1).any(dim=-1)
+
+    def insert(self, bounds: torch.Tensor, cell_indices: torch.Tensor):
+        """Stores an object in all cells it overlaps in every environment
+
+        Args:
+            bounds (torch.Tensor): Bounds of the object relative to the env origins with shape: (|environments|, 4)
+            cell_indices (torch.Tensor): Cell indices of the object (see cell_indices()) with shape: (|environments|, 4)
+        """
+        # every cell only once per environment
+        repeated = torch.tril(cell_indices.unsqueeze(-1) == cell_indices.unsqueeze(-2), diagonal=-1).any(dim=-1)
+        env_ids, entries = (~repeated).nonzero(as_tuple=True)
+        cells = cell_indices[env_ids, entries]
+        slots = self.counts[env_ids, cells]
+        capacity = self.bounds.shape[2]
+        required_capacity = int(slots.max().item()) + 1
+        if required_capacity > capacity:
+            num_envs, num_cells = self.counts.shape
+            extension = self._empty_bounds(num_envs, num_cells, max(capacity, required_capacity - capacity), self.bounds.device)
+            self.bounds = torch.cat([self.bounds, extension], dim=2)
+        self.bounds[env_ids, cells, slots] = bounds[env_ids]
+        self.counts[env_ids, cells] += 1
+
+
+def generate_scene_layout(
+    scene: SceneTensor,
+    location_offsets: torch.Tensor,
+    robot_locations: torch.Tensor,
+    num_candidates: int = 100,
+    sampler: LayoutSampler = "rejection",
+) -> Tuple[torch.Tensor, torch.Tensor]:
+    """Samples the locations of all static objects for all environments at once (batched rejection sampling).
+    Objects without random offset (e.g. walls) are placed at their init_location at once without collision checks.
+    For every randomly placed object, num_candidates locations are sampled per environment and the first
+    candidate without collisions (see validate_locations()) is selected. If no candidate is valid, the last
+    candidate is used and the environment is reported as failed. Randomly placed objects depend on the previously
+    placed objects, so they are placed one after the other (in list order).
+
+    With sampler="grid", randomly placed objects are stored in a SpatialHashGrid (cells of the size of the largest object)
+    and candidates are only checked against the objects in the cells they overlap. Both samplers check the same AABB overlaps
+    and produce the same layouts for the same random state (if fixed objects are listed first), but the grid scales linearly
+    with the number of objects and should be used for dense scenes.
+
+    Args:
+        scene (SceneTensor): Static objects of the scene
+        location_offsets (torch.Tensor): Offsets for placement of the scenes on groundplane (env origins) with shape: (|environments|, 3)
+        robot_locations (torch.Tensor): Locations of the robots at initialisation with shape: (|environments|, 3)
+        num_candidates (int, optional): Number of sampled candidates per object and environment. Defaults to 100.
+        sampler (LayoutSampler, optional): Collision checking backend ("rejection" or "grid"). Defaults to "rejection".
 
     Returns:
-        bool: True if no collision found else False
+        Tuple[torch.Tensor, torch.Tensor]: Object locations with shape: (|environments|, |objects|, 3),
+            failed placements with shape: (|environments|, |objects|)
     """
-    if (torch.abs((location - robot_location)[:2]) < 0.8).any():  # TODO size of robot
-        return False
-    for other_location, other_size in zip(other_object_locations, other_object_sizes):
-        if (
-            other_location != None
-            and (
-                torch.abs((location - other_location)[:2])
-                < ((other_size + object.size) / 2)[:2]
-            ).any()
-        ):
-            return False
-    return True
-
-
-def get_distance_and_angle(robot_location: torch.Tensor, robot_orientation: torch.Tensor, object_location: torch.Tensor) -> Tuple[torch.Tensor, torch.Tensor]:
-    """Calculates distance and angle of an object to the robot
+    num_envs = location_offsets.shape[0]
+    device = location_offsets.device
+    sizes = scene.sizes
+    # does not detect collisions of non-random objects (e.g. walls)
+    locations = (scene.init_locations.unsqueeze(0) + location_offsets.unsqueeze(1)).contiguous()
+    failed = torch.zeros(num_envs, scene.num_objects, dtype=torch.bool, device=device)
+    env_indices = torch.arange(num_envs, device=device)
+
+    grid = SpatialHashGrid.from_scene(scene, num_envs, device) if sampler == "grid" else None
+    if grid is not None:
+        fixed_locations = locations[:, scene.fixed_indices]
+        fixed_sizes = sizes[scene.fixed_indices]
+
+    for object_idx in scene._random_indices_list:
+        candidates = calculate_random_location(
+            location_offsets.unsqueeze(1),
+            scene.init_locations[object_idx],
+            scene.max_random_loc_offsets[object_idx].expand(num_envs, num_candidates, 3),
+        )
+        if grid is None:
+            valid = validate_locations(
+                candidates,
+                sizes[object_idx],
+                robot_locations,
+                locations[:, :object_idx],
+                sizes[:object_idx],
+            )
+        else:
+            # only fixed objects are checked directly, randomly placed objects are stored in the grid
+            valid = validate_locations(candidates, sizes[object_idx], robot_locations, fixed_locations, fixed_sizes)
+            relative_candidates = (candidates - location_offsets.unsqueeze(1))[..., :2]
+            half_size = sizes[object_idx, :2] / 2
+            bounds = torch.cat([relative_candidates - half_size, relative_candidates + half_size], dim=-1)
+            cell_indices = grid.cell_indices(bounds)
+            valid &= grid.validate(bounds, cell_indices)
+
+        # argmax returns the first valid candidate, fall back to the last candidate if none is valid
+        found = valid.any(dim=1)
+        selected = torch.argmax(valid.int(), dim=1).masked_fill_(~found, num_candidates - 1)
+        locations[:, object_idx] = candidates[env_indices, selected]
+        failed[:, object_idx] = ~found
+        if grid is not None:
+            # failed objects are stored as well, later objects are checked against them like in validate_locations()
+            grid.insert(bounds[env_indices, selected], cell_indices[env_indices, selected])
+    return locations, failed
+
+
+class SceneBatch:
+    def __init__(self, scenes: List[List[StaticObject]], num_envs: int, device: str) -> None:
+        """Static objects of one or several scenes in one simulation (environment i uses scene i % |scenes|).
+        Per environment tensors are padded to the maximum number of objects of all scenes, padded slots are marked
+        in validity masks so that placement, detection and rewards stay vectorized over all environments.
+
+        Args:
+            scenes (List[List[StaticObject]]): Static objects of each scene
+            num_envs (int): Number of environments
+            device (str): Device for tensors
+        """
+        self.scenes: List[SceneTensor] = [SceneTensor(static_objects, device) for static_objects in scenes]
+        self.uniform: bool = len(self.scenes) == 1
+        """All environments use the same scene (no padding)"""
+        self.env_scene_ids = torch.arange(num_envs, device=device) % len(self.scenes)
+        """Scene of each environment with shape: (|environments|)"""
+        self.scene_env_ids: List[torch.Tensor] = [
+            (self.env_scene_ids == scene_idx).nonzero(as_tuple=False).flatten() for scene_idx in range(len(self.scenes))
+        ]
+        scene_num_objects = torch.tensor([scene.num_objects for scene in self.scenes], dtype=torch.long, device=device)
+        self.max_objects: int = int(scene_num_objects.max().item())
+        self.num_env_objects = scene_num_objects[self.env_scene_ids]
+        """Number of static objects of each environment with shape: (|environments|)"""
+        self.object_valid = torch.arange(self.max_objects, device=device) < self.num_env_objects.unsqueeze(1)
+        """Valid (not padded) object slots with shape: (|environments|, |max objects|)"""
+        self.plant_slots, self.plant_valid = self._get_slots("plant_indices", num_envs, device)
+        """Object slots of the plants of each environment and their validity with shape: (|environments|, |max plants|)"""
+        self.obstacle_slots, self.obstacle_valid = self._get_slots("obstacle_indices", num_envs, device)
+        """Object slots of the obstacles of each environment and their validity with shape: (|environments|, |max obstacles|)"""
+        self.object_sizes = torch.zeros(num_envs, self.max_objects, 3, dtype=torch.float, device=device)
+        """Sizes (AABB) of the objects of each environment (padded slots have size 0) with shape: (|environments|, |max objects|, 3)"""
+        for scene, env_ids in zip(self.scenes, self.scene_env_ids):
+            self.object_sizes[env_ids, : scene.num_objects] = scene.sizes
+
+    def _get_slots(self, attribute: str, num_envs: int, device: str) -> Tuple[torch.Tensor, torch.Tensor]:
+        max_count = max(len(getattr(scene, attribute)) for scene in self.scenes)
+        slots = torch.zeros(num_envs, max_count, dtype=torch.long, device=device)
+        valid = torch.zeros(num_envs, max_count, dtype=torch.bool, device=device)
+        for scene, env_ids in zip(self.scenes, self.scene_env_ids):
+            indices = getattr(scene, attribute)
+            slots[env_ids, : len(indices)] = indices
+            valid[env_ids, : len(indices)] = True
+        return slots, valid
+
+    @staticmethod
+    def gather(locations: torch.Tensor, slots: torch.Tensor) -> torch.Tensor:
+        """Gathers the locations of object slots (e.g. plant_slots) with shape: (|environments|, |slots|, 3)"""
+        return locations.gather(1, slots.unsqueeze(-1).expand(-1, -1, 3))
+
+    def generate_layout(
+        self,
+        env_ids: torch.Tensor,
+        location_offsets: torch.Tensor,
+        robot_locations: torch.Tensor,
+        num_candidates: int = 100,
+        sampler: LayoutSampler = "rejection",
+    ) -> Tuple[torch.Tensor, torch.Tensor]:
+        """Samples the layouts of the selected environments with generate_scene_layout() (once per scene).
+        Padded object slots are located at the env origin.
+
+        Args:
+            env_ids (torch.Tensor): Environment ids
+            location_offsets (torch.Tensor): Env origins of the environments with shape: (|env_ids|, 3)
+            robot_locations (torch.Tensor): Robot locations of the environments with shape: (|env_ids|, 3)
+            num_candidates (int, optional): Number of sampled candidates per object and environment. Defaults to 100.
+            sampler (LayoutSampler, optional): Collision checking backend ("rejection" or "grid"). Defaults to "rejection".
+
+        Returns:
+            Tuple[torch.Tensor, torch.Tensor]: Object locations with shape: (|env_ids|, |max objects|, 3),
+                failed placements with shape: (|env_ids|, |max objects|)
+        """
+        if self.uniform:
+            return generate_scene_layout(self.scenes[0], location_offsets, robot_locations, num_candidates, sampler)
+
+        locations = location_offsets.unsqueeze(1).repeat(1, self.max_objects, 1)
+        failed = torch.zeros(len(env_ids), self.max_objects, dtype=torch.bool, device=location_offsets.device)
+        env_scene_ids = self.env_scene_ids[env_ids]
+        for scene_idx, scene in enumerate(self.scenes):
+            subset = (env_scene_ids == scene_idx).nonzero(as_tuple=False).flatten()
+            if not scene.num_objects or not len(subset):
+                continue
+            scene_locations, scene_failed = generate_scene_layout(
+                scene, location_offsets[subset], robot_locations[subset], num_candidates, sampler
+            )
+            locations[subset, : scene.num_objects] = scene_locations
+            failed[subset, : scene.num_objects] = scene_failed
+        return locations, failed
+
+
+def get_index_table(counts: torch.Tensor, max_count: int) -> Tuple[torch.Tensor, torch.Tensor]:
+    """Creates a table of the flat indices of consecutive entries per row, e.g. the simulation actor ids of each environment
 
     Args:
-        robot_location (torch.Tensor): Absolute location of the robot (in m)
-        robot_orientation (torch.Tensor): Orientation of the robot (in radians)
-        object_location (torch.Tensor): Absolute location of the object (in m)
+        counts (torch.Tensor): Number of entries of each row with shape: (|rows|)
+        max_count (int): Number of columns (at least counts.max())
 
     Returns:
-        Tuple[torch.Tensor, torch.Tensor]: Distance (in m), angle to robot (in radians)
+        Tuple[torch.Tensor, torch.Tensor]: Indices (padded entries point to the first entry of the row),
+            valid (not padded) entries with shape: (|rows|, max_count)
     """
-    # Compute distance from robot to plant
-    distance = torch.norm(object_location - robot_location)
-
-    # Compute angle from robot to plant
-    relative_position = object_location - robot_location
-    angle = torch.atan2(relative_position[1], relative_position[0]) - robot_orientation
-    angle = torch.remainder(angle + torch.pi, 2 * torch.pi) - torch.pi  # Normalize angle to [-pi, pi]
-    return distance, angle
-
-
-def get_object_observation(location: torch.Tensor, distance: torch.Tensor, angle: torch.Tensor, probability: torch.Tensor, fov_angle: torch.Tensor) -> Dict[str, torch.Tensor]:
-    # Check if the plant is within the robot's field of view (FOV)
-    if torch.abs(angle) <= fov_angle:
-        return {
-            "location": location,
-            "probability": probability,
-            "distance": distance,
-            "angle": angle,
-        }
-    else:
-        return {
-            "location": location,
-            "probability": torch.tensor(0).to(location.device),
-            "distance": distance,
-            "angle": angle,
-        }
-
-
-def get_dummy_object_observation(device: str) -> Dict[str, torch.Tensor]:
-    """Gets a dummy observation with 0 probability for correct observation shapes
+    starts = torch.cumsum(counts, dim=0) - counts
+    columns = torch.arange(max_count, device=counts.device)
+    valid = columns < counts.unsqueeze(1)
+    return starts.unsqueeze(1) + columns * valid, valid
+
+
+def get_scene_fingerprint(scenes: List[List[StaticObject]]) -> str:
+    """Creates a fingerprint of the static objects of one or several scenes (names, types, assets, locations, offsets and sizes)
 
     Args:
-        device (str): Device for tensors
+        scenes (List[List[StaticObject]]): Static objects of each scene
 
     Returns:
-        Dict[str, torch.Tensor]: Dummy observation for error prevention
+        str: sha256 hash
     """
-    loc = torch.tensor([0,0]).to(device)
-    prob = torch.tensor(0).to(device)
-    dist = torch.tensor(0).to(device)
-    angle = torch.tensor(0).to(device)
-    return get_object_observation(loc, dist, angle, prob, 0)
+    scene_hash = hashlib.sha256()
+    for static_objects in scenes:
+        scene_hash.update(b"scene")
+        for static_obj in static_objects:
+            scene_hash.update(repr((
+                static_obj.name,
+                static_obj.type,
+                str(static_obj.asset_file),
+                static_obj.init_location.tolist(),
+                static_obj.max_random_loc_offset.tolist(),
+                static_obj.size.tolist(),
+            )).encode())
+    return scene_hash.hexdigest()
+
+
+def get_layout_snapshot_path(snapshot_dir: Path, scene_name: str, scene_fingerprint: str) -> Path:
+    """Returns the path of the layout snapshot of a scene config (see get_scene_fingerprint()).
+    The snapshot stores one layout per environment and is shared by runs with different numbers of environments"""
+    return Path(snapshot_dir) / f"layout_{scene_name}_{scene_fingerprint[:16]}.npz"
+
+
+def save_layout_snapshot(path: Path, object_locations: torch.Tensor, robot_locations: torch.Tensor, scene_fingerprint: str):
+    """Saves a scene layout (relative to the environment origins) as uncompressed .npz file
+
+    Args:
+        path (Path): Snapshot file
+        object_locations (torch.Tensor): Locations of the static objects with shape (|environments|, |objects|, 3)
+        robot_locations (torch.Tensor): Initial robot locations with shape (|environments|, 3)
+        scene_fingerprint (str): Fingerprint of the scene (see get_scene_fingerprint())
+    """
+    path.parent.mkdir(parents=True, exist_ok=True)
+    np.savez(
+        path,
+        object_locations=object_locations.cpu().numpy().astype(np.float32),
+        robot_locations=robot_locations.cpu().numpy().astype(np.float32),
+        scene_fingerprint=np.array(scene_fingerprint),
+    )
 
 
-def convert_object_property(objects: List[List[Dict[str, torch.Tensor]]], property: str, device: str) -> torch.Tensor:
-    """Extracts object property from list of objects and creates a tensor from them
+def load_layout_snapshot(
+    path: Path, scene_fingerprint: str, num_envs: int, device: str
+) -> Tuple[torch.Tensor, torch.Tensor]:
+    """Loads the layouts of the first num_envs environments of a scene layout saved with save_layout_snapshot()
+    (environment i uses scene i % |scenes| for any number of environments, see SceneBatch).
+    Snapshots with fewer environments only contain the layouts of the first environments.
 
     Args:
-        objects (List[List[Dict[str, torch.Tensor]]]): List of objects (for all environments)
-        property (str): Property of object (location, distance, angle or probability)
-        device (str): Device for tensors
+        path (Path): Snapshot file
+        scene_fingerprint (str): Fingerprint of the current scene (see get_scene_fingerprint())
+        num_envs (int): Number of environments
+        device (str): Device of the returned tensors
+
+    Raises:
+        ValueError: If the snapshot was created for a different scene
 
     Returns:
-        torch.Tensor: Converted object properties (for all environments)
+        Tuple[torch.Tensor, torch.Tensor]: Object locations (|loaded environments|, |objects|, 3) and robot locations (|loaded environments|, 3)
+            with |loaded environments| = min(num_envs, |environments in the snapshot|)
     """
-    return torch.tensor([object[property] for _objects in objects for object in _objects],
-                                       device=device).view((len(objects), len(objects[0]))).squeeze(1)
+    with np.load(path) as snapshot:
+        if str(snapshot["scene_fingerprint"]) != scene_fingerprint:
+            raise ValueError(f"Layout snapshot {path} was created for a different scene config")
+        object_locations = torch.from_numpy(snapshot["object_locations"][:num_envs]).to(device)
+        robot_locations = torch.from_numpy(snapshot["robot_locations"][:num_envs]).to(device)
+    return object_locations, robot_locations
+
+
+class DetectionBatch:
+    def __init__(self, num_envs: int, device: str, num_plants: int = 1, num_obstacles: int = 1, nearest_first: bool = False) -> None:
+        """Struct of arrays holding the most likely detected plants and obstacles of all environments
+
+        Args:
+            num_envs (int): Number of environments
+            device (str): Device for tensors
+            num_plants (int, optional): Number of detected plants per environment. Defaults to 1.
+            num_obstacles (int, optional): Number of detected obstacles per environment. Defaults to 1.
+            nearest_first (bool, optional): Sorts detected objects by distance instead of their order in the scene. Defaults to False.
+        """
+        object_types = typing.get_args(ObjectType)
+        self.plants = ObjectDetections(num_envs, object_types.index("flower_pot"), device, num_plants, nearest_first)
+        self.obstacles = ObjectDetections(num_envs, object_types.index("obstacle"), device, num_obstacles, nearest_first)
+
+
+def get_num_observations(cfg: GO2HighLevelPlantPolicyCfg) -> int:
+    """Number of high-level observations: probability, visible distance and visible angle of every observed plant and obstacle
+    (cfg.detection.num_plants and cfg.detection.num_obstacles) followed by the depth sectors (cfg.camera.split_to_width)
 
+    Args:
+        cfg (GO2HighLevelPlantPolicyCfg): Robot configuration
 
-def get_reset_indices(env_ids: torch.Tensor, num_objects: int) -> torch.Tensor:
-    """Creates a tensor with the indices for all objects within the specified environments.
+    Returns:
+        int: Number of observations
+    """
+    detection = getattr(cfg, "detection", None)
+    num_targets = getattr(detection, "num_plants", 1) + getattr(detection, "num_obstacles", 0)
+    return 3 * num_targets + cfg.camera.split_to_width
+
+
+def get_options_fingerprint(options: Any, max_depth: int = 2) -> Tuple:
+    """Creates a hashable fingerprint of all public attributes of an options object (e.g. gymapi.AssetOptions)
 
     Args:
-        env_ids (torch.Tensor): Environment IDs (0, 1, 2, 3, ...)
-        num_objects (int): Number of objects per environment.
+        options (Any): Options object
+        max_depth (int, optional): Maximum depth of nested options objects (e.g. vhacd_params). Defaults to 2.
 
     Returns:
-        torch.Tensor: Tensor with all indices for specified environments (torch.int32)
+        Tuple: Sorted (attribute name, value) pairs
     """
-    stubs = torch.arange(0, num_objects, device=env_ids.device).repeat(
-        (len(env_ids), 1)
-    )
-    return (stubs + env_ids.unsqueeze(1) * num_objects).view(-1).to(dtype=torch.int32)
+    fingerprint = []
+    for name in sorted(dir(options)):
+        if name.startswith("_"):
+            continue
+        value = getattr(options, name)
+        if callable(value):
+            continue
+        if not isinstance(value, (bool, int, float, str)) and max_depth > 0:
+            value = get_options_fingerprint(value, max_depth - 1)
+        elif not isinstance(value, (bool, int, float, str)):
+            value = str(value)
+        fingerprint.append((name, value))
+    return tuple(fingerprint)
+
+
+class AssetCache:
+    def __init__(self, gym: Any, sim: Any) -> None:
+        """Loads every distinct asset only once for all environments and static objects
+
+        Args:
+            gym (Any): Gym API (gymapi.Gym)
+            sim (Any): Simulation handle
+        """
+        self.gym = gym
+        self.sim = sim
+        self.assets: Dict[Tuple[str, str, Tuple], Any] = {}
+        self.loads: int = 0
+        self.hits: int = 0
+        self.load_time: float = 0.0
+
+    def load(self, asset_root: str, asset_file: str, asset_options: Any) -> Any:
+        """Returns the cached asset or loads it with gym.load_asset()
+
+        Args:
+            asset_root (str): Root directory of the asset
+            asset_file (str): Asset file relative to the root directory
+            asset_options (Any): gymapi.AssetOptions
+
+        Returns:
+            Any: Asset handle
+        """
+        key = (str(asset_root), str(asset_file), get_options_fingerprint(asset_options))
+        if key in self.assets:
+            self.hits += 1
+        else:
+            start = time.perf_counter()
+            self.assets[key] = self.gym.load_asset(self.sim, str(asset_root), str(asset_file), asset_options)
+            self.load_time += time.perf_counter() - start
+            self.loads += 1
+        return self.assets[key]
+
+    def __str__(self) -> str:
+        return f"AssetCache: loaded {self.loads} distinct assets in {self.load_time:.2f}s ({self.hits} cache hits)"
 
 
 def load_low_level_policy(cfg: GO2HighLevelPlantPolicyCfg, sim_device):
@@ -205,4 +672,162 @@ def load_low_level_policy(cfg: GO2HighLevelPlantPolicyCfg, sim_device):
         print(e)
         return None
 
-    return module
\ No newline at end of file
+    # the low-level policy is only used for inference
+    module.eval()
+    module.requires_grad_(False)
+    return module
+
+
+class LowLevelActor(torch.nn.Module):
+    """Inference-only actor of the low-level policy (same layers as the actor of rsl_rl's ActorCritic without the critic)
+
+    Args:
+        actor_state_dict (Dict[str, torch.Tensor]): Weights of the actor ("0.weight", "0.bias", "2.weight", ...)
+        dtype (torch.dtype, optional): Dtype of the weights. Observations are cast to it, actions are returned as float32.
+    """
+
+    def __init__(self, actor_state_dict: Dict[str, torch.Tensor], dtype: torch.dtype = torch.float32):
+        super().__init__()
+        linear_indices = sorted({int(key.split(".")[0]) for key in actor_state_dict})
+        layers = []
+        for layer_idx, state_idx in enumerate(linear_indices):
+            if layer_idx > 0:
+                layers.append(torch.nn.ELU())
+            out_features, in_features = actor_state_dict[f"{state_idx}.weight"].shape
+            layers.append(torch.nn.Linear(in_features, out_features))
+        self.actor = torch.nn.Sequential(*layers)
+        self.actor.load_state_dict(actor_state_dict)
+        self.actor.to(dtype)
+        self.dtype = dtype
+
+    def forward(self, observations: torch.Tensor) -> torch.Tensor:
+        return self.actor(observations.to(self.dtype)).float()
+
+
+def get_file_hash(path: Path) -> str:
+    """Calculates the sha256 hash of a file (e.g. a checkpoint)"""
+    file_hash = hashlib.sha256()
+    with open(path, "rb") as file:
+        for chunk in iter(lambda: file.read(1 << 20), b""):
+            file_hash.update(chunk)
+    return file_hash.hexdigest()
+
+
+def get_low_level_cache_path(checkpoint_path: Path, dtype: torch.dtype, device: torch.device) -> Path:
+    """Path of the cached TorchScript low-level policy next to the checkpoint, keyed on the sha256 hash of the checkpoint
+    (changed checkpoints are traced again).
+
+    Args:
+        checkpoint_path (Path): Path of the low-level policy checkpoint
+        dtype (torch.dtype): Dtype of the weights
+        device (torch.device): Device of the policy
+
+    Returns:
+        Path: Path of the cached policy ({stem}_{key}_{dtype}_{device type}.ts)
+    """
+    key = get_file_hash(checkpoint_path)[:16]
+    return checkpoint_path.with_name(f"{checkpoint_path.stem}_{key}_{str(dtype).split('.')[-1]}_{device.type}.ts")
+
+
+def load_cached_low_level_policy(cache_path: Path, device: torch.device) -> Optional[torch.jit.ScriptModule]:
+    """Loads a cached TorchScript low-level policy if it exists and its hash matches the hash stored when it was saved
+    (the policy was verified against act_inference before it was saved, see save_cached_low_level_policy())
+
+    Args:
+        cache_path (Path): Path of the cached policy (see get_low_level_cache_path())
+        device (torch.device): Device of the policy
+
+    Returns:
+        Optional[torch.jit.ScriptModule]: Cached policy or None if there is no valid cache file
+    """
+    hash_path = cache_path.with_name(cache_path.name + ".sha256")
+    if not cache_path.exists() or not hash_path.exists():
+        return None
+    if get_file_hash(cache_path) != hash_path.read_text().strip():
+        print(f"Cached low-level policy {cache_path} is corrupted, tracing again")
+        return None
+    return torch.jit.load(str(cache_path), map_location=device)
+
+
+def save_cached_low_level_policy(cache_path: Path, policy: torch.jit.ScriptModule):
+    """Saves a verified TorchScript low-level policy and the hash of the saved file (see load_cached_low_level_policy())"""
+    torch.jit.save(policy, str(cache_path))
+    cache_path.with_name(cache_path.name + ".sha256").write_text(get_file_hash(cache_path))
+
+
+def load_low_level_backend(cfg: GO2HighLevelPlantPolicyCfg, sim_device) -> Optional[Callable[[torch.Tensor], torch.Tensor]]:
+    """Loads the frozen low-level policy with the backend specified in cfg.low_level_policy
+
+    "eager" uses rsl_rl's ActorCritic.act_inference. "torchscript" traces a LowLevelActor and caches the traced module
+    next to the checkpoint (see get_low_level_cache_path()). On a cache hit the cached module is loaded directly without
+    building the eager policy. "compile" uses torch.compile and falls back to TorchScript if it is not available or fails.
+    The outputs of newly compiled or traced backends are compared with act_inference on random observations before they are used.
+
+    Args:
+        cfg (GO2HighLevelPlantPolicyCfg): Config with the low_level_policy settings
+        sim_device: Device of the simulation
+
+    Returns:
+        Optional[Callable[[torch.Tensor], torch.Tensor]]: Maps observations (num_envs, num_observations) to actions (num_envs, num_actions).
+            None if the checkpoint could not be loaded.
+    """
+    backend = getattr(cfg.low_level_policy, "backend", "eager")
+    if backend not in ("eager", "torchscript", "compile"):
+        raise ValueError(f"Unknown low-level policy backend: {backend}")
+    device = torch.device(sim_device)
+    dtype = getattr(torch, getattr(cfg.low_level_policy, "dtype", "float32"))
+    if device.type == "cpu" and dtype == torch.float16:
+        print("float16 is not supported for the low-level policy on the cpu, using float32 instead")
+        dtype = torch.float32
+
+    checkpoint_path = Path(cfg.low_level_policy.path)
+    # missing checkpoints are handled by load_low_level_policy()
+    use_cache = getattr(cfg.low_level_policy, "cache_compiled", True) and backend != "eager" and checkpoint_path.is_file()
+    cache_path = get_low_level_cache_path(checkpoint_path, dtype, device) if use_cache else None
+    if backend == "torchscript" and use_cache:
+        cached_actor = load_cached_low_level_policy(cache_path, device)
+        if cached_actor is not None:
+            return cached_actor
+
+    policy = load_low_level_policy(cfg, sim_device)
+    if policy is None or backend == "eager":
+        return policy.act_inference if policy is not None else None
+
+    tolerance = 1e-4 if dtype == torch.float32 else 5e-2
+
+    example_observations = torch.randn(cfg.low_level_policy.num_observations * 4, cfg.low_level_policy.num_observations, device=device)
+    with torch.inference_mode():
+        expected_actions = policy.act_inference(example_observations)
+
+    def verify(backend_policy: Callable[[torch.Tensor], torch.Tensor]) -> bool:
+        with torch.inference_mode():
+            actions = backend_policy(example_observations)
+        return torch.allclose(actions, expected_actions, atol=tolerance, rtol=tolerance)
+
+    actor_state_dict = {key[len("actor."):]: value for key, value in policy.state_dict().items() if key.startswith("actor.")}
+    actor = LowLevelActor(actor_state_dict, dtype=dtype).to(device).eval().requires_grad_(False)
+
+    if backend == "compile":
+        if hasattr(torch, "compile"):
+            try:
+                compiled_actor = torch.compile(actor)
+                if verify(compiled_actor):
+                    return compiled_actor
+                print("torch.compile'd low-level policy does not match act_inference, falling back to TorchScript")
+            except Exception as e:
+                print(f"torch.compile failed for the low-level policy, falling back to TorchScript: {e}")
+        else:
+            print("torch.compile is not available, falling back to TorchScript")
+        if use_cache:
+            cached_actor = load_cached_low_level_policy(cache_path, device)
+            if cached_actor is not None:
+                return cached_actor
+
+    with torch.no_grad():
+        traced_actor = torch.jit.freeze(torch.jit.trace(actor, example_observations))
+    if not verify(traced_actor):
+        print("Traced low-level policy does not match act_inference, using eager execution")
+        return policy.act_inference
+    if use_cache:
+        save_cached_low_level_policy(cache_path, traced_actor)
+    return traced_actor
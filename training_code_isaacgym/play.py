@@ -25,6 +25,7 @@ scenes = {
     "plant_environment": scene_configs.PlantEnvironmentCfg(),
     "single_plant": scene_configs.SinglePlantCfg(),
     "single_plant_with_obstacles": scene_configs.SinglePlantWithObstaclesCfg(),
+    "mixed": scene_configs.MixedSceneCfg(),
 }
 algorithms = {
     "ppo_default": alg_configs.PPODefaultCfg(),
@@ -74,6 +75,11 @@ def get_args():
             "default": "ppo_default",
             "help": f"Name of algorithm config to use. Options: {list(algorithms.keys())}",
         },
+        {
+            "name": "--layout_snapshot_dir",
+            "type": str,
+            "help": "Directory of scene layout snapshots. Loads the layouts of the first environments from the snapshot of the scene (e.g. saved by a training run), layouts of missing environments are sampled and added to it. Overrides config file if provided.",
+        },
         # useless but needed arguments
         {
             "name": "--resume",
@@ -143,6 +149,8 @@ def get_configs(
 ) -> Tuple[
     robot_configs.GO2DefaultCfg, scene_configs.BaseSceneCfg, alg_configs.PPODefaultCfg
 ]:
+    if args.layout_snapshot_dir is not None:
+        scenes[args.scene].layout_snapshot_dir = args.layout_snapshot_dir
     return (
         robots[args.robot],
         scenes[args.scene],